@@ -0,0 +1,30 @@
+"""
+Build hook that ships the CLI's static output pre-rendered in the wheel.
+
+Project metadata lives in pyproject.toml; this file only extends build_py.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from setuptools import setup
+from setuptools.command.build_py import build_py
+
+class BuildPyWithCliText(build_py):
+    """build_py that also generates observability_mcp/_cli_text.py."""
+
+    def run(self):
+        super().run()
+        target = Path(self.build_lib) / "observability_mcp" / "_cli_text.py"
+        env = dict(os.environ, PYTHONPATH=os.path.abspath(self.build_lib))
+        # Render in a subprocess so rich is imported against the built package only
+        result = subprocess.run(
+            [sys.executable, "-m", "observability_mcp._textgen", str(target)],
+            env=env,
+        )
+        if result.returncode != 0:
+            self.warn("could not pre-render CLI output; it will be rendered at runtime")
+
+setup(cmdclass={"build_py": BuildPyWithCliText})
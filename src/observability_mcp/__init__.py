@@ -0,0 +1,3 @@
+"""Observability MCP Server: FastMCP-based monitoring for MCP ecosystems."""
+
+__version__ = "0.1.0"
@@ -0,0 +1,23 @@
+"""
+Entry point for ``observability-mcp`` and ``python -m observability_mcp``.
+
+Kept deliberately tiny: resolving the console script imports only this module,
+and the CLI module is imported once we know a real command was requested.
+"""
+
+import sys
+
+from . import __version__
+
+
+def main():
+    """Console script entry point."""
+    if len(sys.argv) > 1 and sys.argv[1] in ("--version", "-V"):
+        sys.stdout.write(f"observability-mcp {__version__}\n")
+        return
+
+    from .cli import main as cli_main
+    cli_main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Build-time renderer for the CLI's static output.
+
+Run by the setup.py build hook as ``python -m observability_mcp._textgen TARGET``.
+Writes a module of pre-rendered ANSI bytes (HEALTH, METRICS, DOCS) that the CLI
+replays on terminals, so those commands never import rich at runtime.
+"""
+
+import io
+import sys
+
+from rich.console import Console
+
+from . import cli
+
+def render() -> dict:
+    """Render each static command with a fixed-width terminal console."""
+    console = Console(
+        file=io.StringIO(), force_terminal=True, color_system="standard", width=cli._PREBUILT_WIDTH
+    )
+    return {
+        "HEALTH": cli._render_health(console),
+        "METRICS": cli._render_metrics(console),
+        "DOCS": cli._render_docs(console),
+    }
+
+def main(argv: list) -> None:
+    """Write the generated module to the path given on the command line."""
+    target = argv[1]
+    lines = ['"""Pre-rendered CLI output, generated at build time by _textgen. Do not edit."""', ""]
+    for name, text in render().items():
+        lines.append(f"{name}: bytes = {text.encode('utf-8')!r}")
+    with open(target, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,56 @@
+"""
+In-memory TTL cache for computed tool results.
+
+Used for results that are expensive to recompute from storage but only change
+when new data is written, such as performance reports.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+
+class TTLCache:
+    """Bounded mapping whose entries expire ``ttl`` seconds after they are set.
+
+    The least recently used entry is evicted once ``maxsize`` is exceeded.
+    Keys are tuples so related entries can be invalidated by prefix.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[Hashable, ...], Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple[Hashable, ...], default: Any = None) -> Any:
+        """Return the value for key if it has not expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Tuple[Hashable, ...], value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, prefix: Tuple[Hashable, ...]) -> int:
+        """Drop every entry whose key starts with prefix and return how many were dropped."""
+        stale = [key for key in self._entries if key[:len(prefix)] == prefix]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
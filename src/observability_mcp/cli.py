@@ -2,68 +2,280 @@
 CLI interface for the Observability MCP Server.
 
 Provides command-line tools for managing and interacting with the observability server.
+
+Argument parsing uses the standard library argparse; rich is imported lazily
+inside the commands that render output, so parsing arguments does not pay its
+import cost up front. Wheel builds also ship the static output pre-rendered
+(see _textgen.py), in which case terminals get it without importing rich at all.
 """
 
-import asyncio
-import typer
-from rich.console import Console
-from rich.table import Table
+import importlib
+import sys
+from functools import cache
+from typing import List, Optional
+
+from . import __version__ as VERSION
+
+_HELP_TEXT = """\
+usage: observability-mcp [-h] [-V] {run,health,metrics,docs} ...
+
+Observability MCP Server CLI
+
+positional arguments:
+  {run,health,metrics,docs}
+    run                 Run the observability MCP server.
+    health              Check server health and status.
+    metrics             Display current metrics and monitoring status.
+    docs                Display documentation links.
+
+options:
+  -h, --help            show this help message and exit
+  -V, --version         show program's version number and exit
+"""
+
+console = None
+_metrics_rendered: Optional[str] = None
+_docs_rendered: Optional[bytes] = None
+
+# Names resolved on first access by the module-level __getattr__ (PEP 562)
+_LAZY_IMPORTS = {
+    "Console": ("rich.console", "Console"),
+    "Table": ("rich.table", "Table"),
+}
 
-app = typer.Typer(help="Observability MCP Server CLI")
-console = Console()
+def __getattr__(name: str):
+    """Import rich classes on first attribute access and cache them as globals."""
+    if name in _LAZY_IMPORTS:
+        module_name, attr = _LAZY_IMPORTS[name]
+        value = getattr(importlib.import_module(module_name), attr)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _lazy(name: str):
+    """Resolve a lazy global from inside this module.
+
+    Bare-name lookups inside the module bypass PEP 562, so route them through
+    the module __getattr__ until the name has been cached in globals().
+    """
+    return globals()[name] if name in globals() else __getattr__(name)
+
+def _get_console():
+    """Return the shared rich console, creating it on first use."""
+    global console
+    if console is None:
+        console = _lazy("Console")()
+    return console
+
+# Width and color system the build-time output was rendered with (see _textgen.py)
+_PREBUILT_WIDTH = 80
+
+def _prebuilt_fits_terminal() -> bool:
+    """Whether this terminal can show the pre-rendered output as rich would render it live."""
+    import os
+    import shutil
+
+    if os.environ.get("NO_COLOR") or os.environ.get("TERM") == "dumb":
+        return False
+    return shutil.get_terminal_size().columns >= _PREBUILT_WIDTH
+
+def _write_prebuilt(name: str) -> bool:
+    """Write build-time rendered output for a command, if it was shipped."""
+    if not sys.stdout.isatty() or not _prebuilt_fits_terminal():
+        return False
+    try:
+        from . import _cli_text
+    except ImportError:
+        return False
+    sys.stdout.flush()
+    sys.stdout.buffer.write(getattr(_cli_text, name))
+    sys.stdout.buffer.flush()
+    return True
 
-@app.command()
 def run():
     """Run the observability MCP server."""
-    from .server import main
-    main()
+    if sys.platform == "win32":
+        # exec on Windows spawns a new process and exits this one, which would
+        # drop the stdio transport the MCP client is attached to
+        from .server import main
+        main()
+        return
+
+    # Replace this process with the server module so the CLI never imports it
+    import os
+    os.execvp(sys.executable, [sys.executable, "-m", "observability_mcp.server"])
+
+_HEALTH_LINES = (
+    ("✓ Observability MCP Server", "green"),
+    (f"Version: {VERSION}", None),
+    ("Status: Ready to monitor MCP ecosystems", None),
+    ("FastMCP: 2.14.1+ with OpenTelemetry integration", None),
+)
 
-@app.command()
 def health():
     """Check server health and status."""
-    console.print("[green]✓ Observability MCP Server[/green]")
-    console.print("Version: 0.1.0")
-    console.print("Status: Ready to monitor MCP ecosystems")
-    console.print("FastMCP: 2.14.1+ with OpenTelemetry integration")
+    if not sys.stdout.isatty():
+        # Probes and pipes get plain text without importing rich
+        sys.stdout.write("".join(f"{text}\n" for text, _ in _HEALTH_LINES))
+        return
+
+    if not _write_prebuilt("HEALTH"):
+        sys.stdout.write(_render_health(_get_console()))
+
+def _render_health(console) -> str:
+    """Render the health lines with rich markup."""
+    lines = [f"[{style}]{text}[/{style}]" if style else text for text, style in _HEALTH_LINES]
+    with console.capture() as capture:
+        console.print("\n".join(lines))
+    return capture.get()
+
+_METRIC_ROWS = (
+    ("OpenTelemetry", "✓ Active", "Distributed tracing and metrics"),
+    ("Prometheus", "✓ Active", "Metrics export on port 9090"),
+    ("Health Checks", "✓ Enabled", "Real-time service monitoring"),
+    ("Performance Tracking", "✓ Enabled", "CPU, memory, disk metrics"),
+    ("Persistent Storage", "✓ Enabled", "Historical data retention"),
+)
+
+# Label values for the machine-readable formats, e.g. "health_checks"
+_COMPONENTS = tuple(metric.lower().replace(" ", "_") for metric, _, _ in _METRIC_ROWS)
 
-@app.command()
-def metrics():
+def metrics(fmt: str = "table"):
     """Display current metrics and monitoring status."""
-    table = Table(title="Observability MCP Metrics")
+    global _metrics_rendered
+    if fmt == "prom":
+        # Prometheus text exposition format, written directly for scrapers
+        lines = [
+            "# HELP observability_mcp_component_up Whether an observability component is enabled.",
+            "# TYPE observability_mcp_component_up gauge",
+        ]
+        lines.extend(
+            f'observability_mcp_component_up{{component="{name}"}} 1' for name in _COMPONENTS
+        )
+        sys.stdout.write("\n".join(lines) + "\n")
+        return
+    if fmt == "json":
+        import json
+
+        payload = {"version": VERSION, "components": {name: True for name in _COMPONENTS}}
+        sys.stdout.write(json.dumps(payload) + "\n")
+        return
+
+    if _write_prebuilt("METRICS"):
+        return
+    if _metrics_rendered is None:
+        # The table is static, so render it once and replay the captured output
+        _metrics_rendered = _render_metrics(_get_console())
+
+    sys.stdout.write(_metrics_rendered)
+    sys.stdout.flush()
+
+def _render_metrics(console) -> str:
+    """Render the metrics table."""
+    table = _lazy("Table")(title="Observability MCP Metrics")
     table.add_column("Metric", style="cyan")
     table.add_column("Status", style="green")
     table.add_column("Description")
 
-    table.add_row("OpenTelemetry", "✓ Active", "Distributed tracing and metrics")
-    table.add_row("Prometheus", "✓ Active", "Metrics export on port 9090")
-    table.add_row("Health Checks", "✓ Enabled", "Real-time service monitoring")
-    table.add_row("Performance Tracking", "✓ Enabled", "CPU, memory, disk metrics")
-    table.add_row("Persistent Storage", "✓ Enabled", "Historical data retention")
+    for row in _METRIC_ROWS:
+        table.add_row(*row)
 
-    console.print(table)
+    with console.capture() as capture:
+        console.print(table)
+    return capture.get()
+
+_DOCS_LINES = (
+    "[bold blue]📚 Observability MCP Documentation[/bold blue]",
+    "",
+    "📖 [link=https://github.com/sandraschi/observability-mcp]GitHub Repository[/link]",
+    "📊 [link=http://localhost:9090]Prometheus Metrics[/link]",
+    "🔍 [link=https://opentelemetry.io]OpenTelemetry Documentation[/link]",
+    "",
+    "[yellow]Tools Available:[/yellow]",
+    "• monitor_server_health - Real-time health checks",
+    "• collect_performance_metrics - System performance tracking",
+    "• trace_mcp_calls - Distributed tracing",
+    "• generate_performance_reports - Automated analysis",
+    "• alert_on_anomalies - Intelligent alerting",
+    "• monitor_system_resources - System-wide monitoring",
+    "• analyze_mcp_interactions - Usage pattern analysis",
+    "• export_metrics - Multiple export formats",
+)
 
-@app.command()
 def docs():
     """Display documentation links."""
-    console.print("[bold blue]📚 Observability MCP Documentation[/bold blue]")
-    console.print()
-    console.print("📖 [link=https://github.com/sandraschi/observability-mcp]GitHub Repository[/link]")
-    console.print("📊 [link=http://localhost:9090]Prometheus Metrics[/link]")
-    console.print("🔍 [link=https://opentelemetry.io]OpenTelemetry Documentation[/link]")
-    console.print()
-    console.print("[yellow]Tools Available:[/yellow]")
-    console.print("• monitor_server_health - Real-time health checks")
-    console.print("• collect_performance_metrics - System performance tracking")
-    console.print("• trace_mcp_calls - Distributed tracing")
-    console.print("• generate_performance_reports - Automated analysis")
-    console.print("• alert_on_anomalies - Intelligent alerting")
-    console.print("• monitor_system_resources - System-wide monitoring")
-    console.print("• analyze_mcp_interactions - Usage pattern analysis")
-    console.print("• export_metrics - Multiple export formats")
+    global _docs_rendered
+    if _write_prebuilt("DOCS"):
+        return
+    if _docs_rendered is None:
+        # The text is static: parse the markup once and keep the encoded output
+        _docs_rendered = _render_docs(_get_console()).encode("utf-8")
+
+    sys.stdout.flush()
+    sys.stdout.buffer.write(_docs_rendered)
+    sys.stdout.buffer.flush()
+
+def _render_docs(console) -> str:
+    """Render the documentation text with rich markup."""
+    with console.capture() as capture:
+        console.print("\n".join(_DOCS_LINES))
+    return capture.get()
+
+COMMANDS = {
+    "run": run,
+    "health": health,
+    "metrics": metrics,
+    "docs": docs,
+}
+
+def _sniff_subcommand(argv: List[str]) -> Optional[str]:
+    """Return the subcommand named in argv, or None if it is absent or unknown."""
+    if len(argv) > 1 and not argv[1].startswith("-") and argv[1] in COMMANDS:
+        return argv[1]
+    return None
+
+@cache
+def _build_parser(command: Optional[str] = None):
+    """Build the argument parser.
+
+    When the invoked subcommand is known only its subparser is registered;
+    otherwise all of them are, so that --help and usage errors list every command.
+    Parsers are memoized per subcommand for repeated in-process invocations.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="observability-mcp",
+        description="Observability MCP Server CLI",
+    )
+    parser.add_argument("-V", "--version", action="version", version=f"%(prog)s {VERSION}")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    names = [command] if command else list(COMMANDS)
+    for name in names:
+        subparser = subparsers.add_parser(name, help=COMMANDS[name].__doc__)
+        if name == "metrics":
+            subparser.add_argument(
+                "--format",
+                dest="fmt",
+                choices=("table", "prom", "json"),
+                default="table",
+                help="Output format (default: table)",
+            )
+    return parser
 
 def main():
     """Main CLI entry point."""
-    app(prog_name="observability-mcp")
+    argv = sys.argv[1:]
+    # Top-level help and version are static, so answer them without building a parser
+    if not argv or argv[0] in ("-h", "--help"):
+        sys.stdout.write(_HELP_TEXT)
+        return
+    if argv[0] in ("--version", "-V"):
+        sys.stdout.write(f"observability-mcp {VERSION}\n")
+        return
+
+    args = vars(_build_parser(_sniff_subcommand(sys.argv)).parse_args())
+    COMMANDS[args.pop("command")](**args)
 
 if __name__ == "__main__":
     main()
@@ -34,30 +34,65 @@ CONFIGURATION:
     Environment variables:
     - PROMETHEUS_PORT: Port for Prometheus metrics (default: 9090)
     - OTEL_SERVICE_NAME: Service name for OpenTelemetry (default: observability-mcp)
-    - OTEL_EXPORTER_OTLP_ENDPOINT: OTLP exporter endpoint
+    - OTEL_EXPORTER_OTLP_ENDPOINT: OTLP exporter endpoint (spans are exported there when set)
+    - OTEL_DEBUG_CONSOLE: Set to 1 to print spans to stdout when no OTLP endpoint is set
+    - OTEL_TRACES_SAMPLER_ARG: Fraction of root traces sampled (default: 0.1)
     - METRICS_RETENTION_DAYS: Days to keep metrics (default: 30)
+    - OBS_MAX_HISTORY: Entries kept per performance and trace history (default: 500 and 200)
+    - HISTORY_FLUSH_INTERVAL: Appends buffered per history key before writing to storage (default: 100)
+    - HISTORY_FLUSH_SECONDS: Seconds between background writes of buffered history (default: 0.25)
+    - METRICS_CACHE_ENABLED: Set to false to disable export and report result caching (default: true)
+    - METRICS_CACHE_TTL_SECONDS: Seconds an export_metrics snapshot is reused (default: 5, 0 disables)
+    - REPORT_CACHE_TTL_SECONDS: Seconds a generated performance report is reused (default: 30)
+    - SYSTEM_SAMPLE_TTL_SECONDS: Seconds a psutil system snapshot is shared by tools (default: 1)
+    - KEY_INDEX_TTL_SECONDS: Seconds before stored keys are rescanned for writes by other processes (default: 60)
+    - EXPORT_DIR: Directory for streamed json exports (default: observability-mcp-exports in the temp dir)
+    - MAX_EXPORT_FILES: Streamed json exports kept in EXPORT_DIR, oldest deleted first (default: 5)
+    - OTEL_BSP_MAX_QUEUE_SIZE: Span queue size before spans are dropped (default: 4096)
+    - OTEL_BSP_SCHEDULE_DELAY: Milliseconds between span batch exports (default: 1000)
+    - OTEL_BSP_MAX_EXPORT_BATCH_SIZE: Maximum spans per export batch (default: 256)
+    - OTEL_BSP_EXPORT_TIMEOUT: Milliseconds before a span export is abandoned (default: 10000)
 """
 
 import asyncio
+import heapq
+import inspect
 import json
+import math
+import operator
 import os
 import re
+import tempfile
 import time
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse
 
+import aiohttp
 import psutil
 import structlog
 from fastmcp import Context, FastMCP
 from opentelemetry import metrics, trace
-from opentelemetry.metrics import Counter, Histogram, UpDownCounter
+from opentelemetry.metrics import Histogram, UpDownCounter
 from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from prometheus_client import start_http_server
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from .cache import TTLCache
+
+# orjson is a dependency; fall back to the stdlib encoder if it cannot be imported
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Configure structured logging
 logger = structlog.get_logger(__name__)
@@ -65,15 +100,14 @@ logger = structlog.get_logger(__name__)
 # OpenTelemetry setup
 meter_provider = MeterProvider()
 metrics.set_meter_provider(meter_provider)
-tracer_provider = TracerProvider()
+# Sample a fraction of root traces; child spans follow their parent's decision
+tracer_provider = TracerProvider(
+    sampler=ParentBased(TraceIdRatioBased(float(os.getenv("OTEL_TRACES_SAMPLER_ARG", "0.1"))))
+)
 trace.set_tracer_provider(tracer_provider)
 
 # Prometheus will automatically read metrics when requested
 
-# Console span exporter for development
-span_processor = BatchSpanProcessor(ConsoleSpanExporter())
-tracer_provider.add_span_processor(span_processor)
-
 # Get meters and tracers
 meter = metrics.get_meter("observability-mcp")
 tracer = trace.get_tracer("observability-mcp")
@@ -104,21 +138,118 @@ alert_counter = meter.create_counter(
 )
 
 # Resource metrics
-cpu_usage_gauge = meter.create_up_down_counter(
+cpu_usage_gauge = meter.create_gauge(
     name="mcp_cpu_usage_percent",
     description="Current CPU usage percentage",
     unit="%"
 )
 
-memory_usage_gauge = meter.create_up_down_counter(
+memory_usage_gauge = meter.create_gauge(
     name="mcp_memory_usage_mb",
     description="Current memory usage in MB",
     unit="MB"
 )
 
+# Seconds; ten buckets covering 5ms to 10s
+health_check_duration = meter.create_histogram(
+    name="mcp_health_check_duration_seconds",
+    description="Health check response time",
+    unit="s",
+    explicit_bucket_boundaries_advisory=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0],
+)
+
+# Label keys that may be attached to metrics; anything else is dropped. Free-form
+# operation names stay on spans only, as they would multiply trace counter series.
+_ALLOWED_LABELS = frozenset({"status", "service", "service_class", "type"})
+
+def _sanitize_label(value: Any, max_len: int = 64) -> str:
+    """Bound a label value: drop any query string or fragment and truncate."""
+    return str(value).split("?", 1)[0].split("#", 1)[0][:max_len]
+
+def _metric_labels(**labels: Any) -> Dict[str, str]:
+    """Build a metric attribute set restricted to allowed, bounded labels."""
+    return {key: _sanitize_label(value) for key, value in labels.items() if key in _ALLOWED_LABELS}
+
+def _service_class(url: str) -> str:
+    """Map a service URL to a stable low-cardinality label: its host."""
+    return urlparse(url).hostname or "unknown"
+
+spans_dropped_counter = meter.create_counter(
+    name="mcp_spans_dropped_total",
+    description="Total number of spans dropped because the export queue was full",
+    unit="1"
+)
+
+class DropCountingSpanProcessor(SpanProcessor):
+    """Wraps a BatchSpanProcessor and counts spans it drops on a full queue.
+
+    The SDK only logs dropped spans, so the queue length is checked before each
+    span is handed over; a full queue means the batch processor will drop one.
+    """
+
+    def __init__(self, processor: BatchSpanProcessor, max_queue_size: int):
+        self.processor = processor
+        self.max_queue_size = max_queue_size
+        # The queue lives on an internal BatchProcessor in newer SDK releases
+        inner = getattr(processor, "_batch_processor", processor)
+        self._queue = getattr(inner, "_queue", getattr(inner, "queue", None))
+
+    def on_start(self, span, parent_context=None) -> None:
+        self.processor.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span) -> None:
+        if self._queue is not None and len(self._queue) >= self.max_queue_size:
+            spans_dropped_counter.add(1)
+        self.processor.on_end(span)
+
+    def shutdown(self) -> None:
+        self.processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.processor.force_flush(timeout_millis)
+
+# Span batching tuned for bursts of short tool-call spans
+BSP_MAX_QUEUE_SIZE = int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096"))
+BSP_SCHEDULE_DELAY_MILLIS = float(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000"))
+BSP_MAX_EXPORT_BATCH_SIZE = int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256"))
+BSP_EXPORT_TIMEOUT_MILLIS = float(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000"))
+
+def _build_span_exporter():
+    """Select the span exporter: OTLP when an endpoint is set, console only for debugging."""
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but the otlp extra is not installed")
+        else:
+            # Endpoint, headers and TLS settings are read from the standard OTEL_* variables
+            return OTLPSpanExporter()
+    if os.getenv("OTEL_DEBUG_CONSOLE") == "1":
+        return ConsoleSpanExporter()
+    return None
+
+span_exporter = _build_span_exporter()
+span_processor = None
+if span_exporter is not None:
+    span_processor = DropCountingSpanProcessor(
+        BatchSpanProcessor(
+            span_exporter,
+            max_queue_size=BSP_MAX_QUEUE_SIZE,
+            schedule_delay_millis=BSP_SCHEDULE_DELAY_MILLIS,
+            max_export_batch_size=BSP_MAX_EXPORT_BATCH_SIZE,
+            export_timeout_millis=BSP_EXPORT_TIMEOUT_MILLIS,
+        ),
+        BSP_MAX_QUEUE_SIZE,
+    )
+    tracer_provider.add_span_processor(span_processor)
+
 # Data models
+# Instances are immutable once built; full validation runs where tool input
+# enters, and trusted rows read back from storage use model_construct.
 class HealthCheckResult(BaseModel):
     """Result of a health check operation."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     service_name: str
     status: str = Field(description="Status: healthy, degraded, unhealthy")
     response_time_ms: float
@@ -128,6 +259,8 @@ class HealthCheckResult(BaseModel):
 
 class PerformanceMetrics(BaseModel):
     """Performance metrics for a service."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     service_name: str
     timestamp: datetime
     cpu_percent: float
@@ -140,6 +273,8 @@ class PerformanceMetrics(BaseModel):
 
 class TraceInfo(BaseModel):
     """Information about a trace."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     trace_id: str
     service_name: str
     operation: str
@@ -150,6 +285,8 @@ class TraceInfo(BaseModel):
 
 class AlertConfig(BaseModel):
     """Configuration for alerts."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     metric_name: str
     threshold: float
     operator: str = Field(description="gt, lt, eq, ne")
@@ -223,12 +360,400 @@ class InputValidator:
         """Validate days parameter (reasonable range)."""
         return 1 <= days <= 365
 
+# Stored keys grouped by prefix (e.g. "performance_history:"), so aggregations
+# look up matching keys instead of scanning the whole key space
+_key_index: Dict[str, Set[str]] = {}
+_key_index_storage: Any = None
+_key_index_scanned_at = 0.0
+
+# Writes from other processes sharing the storage only show up on a rescan
+KEY_INDEX_TTL_SECONDS = float(os.getenv("KEY_INDEX_TTL_SECONDS", "60"))
+
+HISTORY_PREFIXES = ("health_history:", "performance_history:", "trace_history:")
+
+def _key_prefix(key: str) -> str:
+    """Return the index prefix of a key: everything up to and including the first colon."""
+    head, sep, _ = key.partition(":")
+    return head + sep
+
+def _index_stored_key(storage: Any, key: str) -> None:
+    """Record a key written to storage in the prefix index."""
+    if storage is _key_index_storage:
+        _key_index.setdefault(_key_prefix(key), set()).add(key)
+
+async def _storage_set(ctx: Context, key: str, value: Any) -> None:
+    """Write a value to storage and keep the key index in sync."""
+    await ctx.storage.set(key, value)
+    _index_stored_key(ctx.storage, key)
+
+async def _indexed_keys(ctx: Context, prefix: str) -> List[str]:
+    """Return the stored keys under a prefix, in sorted order.
+
+    The index is built from a keys() scan the first time a storage backend is
+    seen; in between, writes through ``_storage_set`` keep it current. That
+    only covers writes made by this process, so the index is rebuilt once it
+    is older than KEY_INDEX_TTL_SECONDS to pick up keys written by others.
+    """
+    global _key_index_storage, _key_index_scanned_at
+    now = time.monotonic()
+    if _key_index_storage is not ctx.storage or now - _key_index_scanned_at >= KEY_INDEX_TTL_SECONDS:
+        _key_index.clear()
+        for key in await ctx.storage.keys():
+            _key_index.setdefault(_key_prefix(key), set()).add(key)
+        _key_index_storage = ctx.storage
+        _key_index_scanned_at = now
+    return sorted(_key_index.get(prefix, ()))
+
+def _dumps(value: Any) -> str:
+    """Encode a storage value as compact JSON text."""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"))
+
+def _loads(value: Any) -> Any:
+    """Decode a value written by ``_dumps``; values stored unencoded pass through."""
+    if isinstance(value, (str, bytes)):
+        return orjson.loads(value) if orjson is not None else json.loads(value)
+    return value
+
+async def _fast_store(storage: Any, key: str, value: Any) -> None:
+    """Write a value to storage pre-encoded as JSON text.
+
+    Encoding here (with orjson when available) leaves the backend a single
+    string to persist instead of a large nested structure.
+    """
+    await storage.set(key, _dumps(value))
+
+async def _fast_load(storage: Any, key: str, default: Any = None) -> Any:
+    """Read a value written by ``_fast_store``."""
+    value = await storage.get(key)
+    return default if value is None else _loads(value)
+
+class HistoryBuffer:
+    """Bounded in-process copy of one history list kept in storage.
+
+    Appends go to a deque capped at the history size and are written back to
+    storage every ``HISTORY_FLUSH_INTERVAL`` appends, every
+    ``HISTORY_FLUSH_SECONDS`` while the server runs, and on shutdown, instead
+    of reading, re-slicing and re-writing the whole list on every call.
+    """
+
+    def __init__(self, storage: Any, key: str, items: List[Dict], max_len: int):
+        self.storage = storage
+        self.key = key
+        self.items: deque = deque(items, maxlen=max_len)
+        self.pending = 0
+        # Serializes flushes so an older snapshot never lands after a newer one
+        self.lock = asyncio.Lock()
+        # Per-hour and per-operation counts of the buffered entries, maintained for trace histories
+        self.hour_counts: Optional[List[int]] = None
+        self.operation_counts: Optional[Counter] = None
+        # One float column per field of the buffered entries, maintained for performance histories
+        self.columns: Optional[Dict[str, deque]] = None
+
+    async def flush(self) -> None:
+        """Write the buffered history back to storage."""
+        async with self.lock:
+            # Appends made while the write is in flight stay pending for the next flush
+            pending = self.pending
+            await _fast_store(self.storage, self.key, list(self.items))
+            _index_stored_key(self.storage, self.key)
+            self.pending -= pending
+
+HISTORY_FLUSH_INTERVAL = max(1, int(os.getenv("HISTORY_FLUSH_INTERVAL", "100")))
+# Caps on the per-service histories; OBS_MAX_HISTORY overrides both
+PERFORMANCE_HISTORY_LIMIT = max(1, int(os.getenv("OBS_MAX_HISTORY", "500")))
+TRACE_HISTORY_LIMIT = max(1, int(os.getenv("OBS_MAX_HISTORY", "200")))
+HISTORY_FLUSH_SECONDS = max(0.01, float(os.getenv("HISTORY_FLUSH_SECONDS", "0.25")))
+MAX_HISTORY_BUFFERS = 256
+
+# History buffers by storage key, least recently used first
+_history_buffers: "OrderedDict[str, HistoryBuffer]" = OrderedDict()
+
+async def _get_history_buffer(ctx: Context, key: str, max_len: int) -> HistoryBuffer:
+    """Return the buffer for a history key, hydrating it from storage on first use."""
+    while True:
+        buffer = _history_buffers.get(key)
+        if buffer is not None and buffer.storage is ctx.storage:
+            _history_buffers.move_to_end(key)
+            return buffer
+        if buffer is not None and buffer.pending:
+            # The key was last buffered for another storage; write its appends back first
+            await buffer.flush()
+            continue
+
+        items = await _fast_load(ctx.storage, key, [])
+        if _history_buffers.get(key) is not buffer or (buffer is not None and buffer.pending):
+            # Another caller buffered this key while storage was being read
+            continue
+
+        # Parse timestamps of entries written before ts_epoch existed once, not on every scan
+        for item in items:
+            if "ts_epoch" not in item and ("timestamp" in item or "start_time" in item):
+                item["ts_epoch"] = _entry_epoch(item)
+        buffer = HistoryBuffer(ctx.storage, key, items, max_len)
+        _history_buffers[key] = buffer
+        if len(_history_buffers) > MAX_HISTORY_BUFFERS:
+            _, evicted = _history_buffers.popitem(last=False)
+            if evicted.pending:
+                await evicted.flush()
+        return buffer
+
+async def _append_bounded(ctx: Context, key: str, item: Dict, max_len: int) -> deque:
+    """Append an item to a bounded history and return the buffered history.
+
+    Items must already be JSON-compatible (e.g. ``model_dump(mode="json")``) so
+    buffered reads look the same as reads that round-trip through storage.
+    """
+    buffer = await _get_history_buffer(ctx, key, max_len)
+    buffer.items.append(item)
+    buffer.pending += 1
+    # A brand-new key is written immediately so storage key scans can find it
+    if buffer.pending >= HISTORY_FLUSH_INTERVAL or len(buffer.items) == 1:
+        await buffer.flush()
+    return buffer.items
+
+async def _append_trace(ctx: Context, key: str, entry: Dict, max_len: int) -> deque:
+    """Append a trace entry, keeping its buffer's hour and operation counts in step.
+
+    The counts are built from the buffered traces once per buffer and then
+    adjusted for the appended and evicted entries only.
+    """
+    buffer = await _get_history_buffer(ctx, key, max_len)
+    evicted = buffer.items[0] if len(buffer.items) == max_len else None
+    history = await _append_bounded(ctx, key, entry, max_len)
+    if buffer.hour_counts is None:
+        buffer.hour_counts = _count_hours(history)
+        buffer.operation_counts = Counter(item.get("operation", "unknown") for item in history)
+        return history
+
+    buffer.hour_counts[_entry_hour(entry)] += 1
+    buffer.operation_counts[entry.get("operation", "unknown")] += 1
+    if evicted is not None:
+        buffer.hour_counts[_entry_hour(evicted)] -= 1
+        operation = evicted.get("operation", "unknown")
+        buffer.operation_counts[operation] -= 1
+        if not buffer.operation_counts[operation]:
+            # Keep only operations still present so len() counts distinct operations
+            del buffer.operation_counts[operation]
+    return history
+
+def _buffered_operation_counts(ctx: Context, key: str) -> Optional[Counter]:
+    """Return a trace buffer's per-operation counts, if it maintains them."""
+    buffer = _history_buffers.get(key)
+    if buffer is None or buffer.storage is not ctx.storage:
+        return None
+    return buffer.operation_counts
+
+def _buffered_hour_counts(ctx: Context, key: str, count: int) -> Optional[List[int]]:
+    """Return a buffer's hour histogram if it describes exactly ``count`` entries."""
+    buffer = _history_buffers.get(key)
+    if (
+        buffer is None
+        or buffer.storage is not ctx.storage
+        or buffer.hour_counts is None
+        or len(buffer.items) != count
+    ):
+        return None
+    return buffer.hour_counts
+
+PERFORMANCE_COLUMNS = ("ts_epoch", "cpu_percent", "memory_mb")
+
+async def _append_performance(ctx: Context, key: str, entry: Dict, max_len: int) -> deque:
+    """Append a performance sample, keeping its buffer's metric columns in step.
+
+    The columns hold the buffered samples' fields as plain floats, so
+    aggregations sum a column instead of looking the field up in every dict.
+    They share the history's cap, so evictions stay aligned with the entries.
+    """
+    buffer = await _get_history_buffer(ctx, key, max_len)
+    history = await _append_bounded(ctx, key, entry, max_len)
+    if buffer.columns is None:
+        buffer.columns = {
+            field: deque((item.get(field, 0) for item in history), maxlen=max_len)
+            for field in PERFORMANCE_COLUMNS
+        }
+    else:
+        for field, column in buffer.columns.items():
+            column.append(entry.get(field, 0))
+    return history
+
+def _buffered_stats(ctx: Context, key: str, cutoff: float) -> Optional["HistoryStats"]:
+    """Aggregate a performance history from its columns if every sample is newer than cutoff.
+
+    Returns None when there are no columns or the window excludes some samples,
+    in which case callers filter and scan the entries themselves.
+    """
+    buffer = _history_buffers.get(key)
+    if buffer is None or buffer.storage is not ctx.storage or buffer.columns is None:
+        return None
+    columns = buffer.columns
+    ts = columns["ts_epoch"]
+    oldest = min(ts) if ts else None
+    if oldest is None or oldest <= cutoff:
+        return None
+
+    cpu, mem = columns["cpu_percent"], columns["memory_mb"]
+    stats = HistoryStats()
+    stats.count = len(buffer.items)
+    stats.sum_cpu, stats.sumsq_cpu, stats.max_cpu = sum(cpu), sum(x * x for x in cpu), max(cpu)
+    stats.sum_mem, stats.sumsq_mem, stats.max_mem = sum(mem), sum(x * x for x in mem), max(mem)
+    stats.min_ts, stats.max_ts = oldest, max(ts)
+    stats.first_timestamp = buffer.items[0]["timestamp"]
+    stats.last_timestamp = buffer.items[-1]["timestamp"]
+    return stats
+
+async def _load_history(ctx: Context, key: str) -> List[Dict]:
+    """Read a history list, preferring buffered appends not yet written to storage."""
+    buffer = _history_buffers.get(key)
+    if buffer is not None and buffer.storage is ctx.storage:
+        return list(buffer.items)
+    return await _fast_load(ctx.storage, key, [])
+
+def _entry_epoch(item: Dict) -> float:
+    """Return a history entry's time as epoch seconds.
+
+    Entries carry a precomputed ``ts_epoch``; ISO strings are parsed only for
+    entries written before that field existed.
+    """
+    ts_epoch = item.get("ts_epoch")
+    if ts_epoch is None:
+        ts_epoch = datetime.fromisoformat(item.get("timestamp") or item["start_time"]).timestamp()
+    return ts_epoch
+
+STORAGE_READ_CONCURRENCY = 32
+
+async def _mget_history(
+    ctx: Context,
+    prefix: str,
+    cutoff: Optional[float] = None,
+) -> Dict[str, List[Dict]]:
+    """Fetch every history stored under a key prefix.
+
+    Backends that provide an async ``multiget(prefix)`` returning a mapping of
+    keys to stored values are read with that single call. Otherwise reads are
+    issued per key, concurrently (bounded by ``STORAGE_READ_CONCURRENCY``).
+    The result maps each key's suffix, i.e. the service name, to its entries,
+    keeping only entries newer than ``cutoff`` (epoch seconds) when it is given.
+    """
+    def window(history: List[Dict]) -> List[Dict]:
+        if cutoff is None:
+            return history
+        return [item for item in history if _entry_epoch(item) > cutoff]
+
+    multiget = getattr(ctx.storage, "multiget", None)
+    if inspect.iscoroutinefunction(multiget):
+        return await _multiget_history(ctx, multiget, prefix, window)
+
+    keys = await _indexed_keys(ctx, prefix)
+    semaphore = asyncio.Semaphore(STORAGE_READ_CONCURRENCY)
+
+    async def fetch(key: str) -> List[Dict]:
+        async with semaphore:
+            history = await _load_history(ctx, key)
+        return window(history)
+
+    results = await asyncio.gather(*(fetch(key) for key in keys), return_exceptions=True)
+
+    histories = {}
+    for key, result in zip(keys, results):
+        if isinstance(result, Exception):
+            logger.warning("Failed to read history", key=key, error=str(result))
+            continue
+        histories[key[len(prefix):]] = result
+    return histories
+
+async def _multiget_history(
+    ctx: Context,
+    multiget: Callable,
+    prefix: str,
+    window: Callable[[List[Dict]], List[Dict]],
+) -> Dict[str, List[Dict]]:
+    """Fetch every history under a prefix with one ``multiget`` call to storage."""
+    stored = await multiget(prefix)
+
+    histories = {}
+    for key in sorted(stored):
+        _index_stored_key(ctx.storage, key)
+        buffer = _history_buffers.get(key)
+        try:
+            if buffer is not None and buffer.storage is ctx.storage:
+                # Buffered appends may not have been written back yet
+                history = list(buffer.items)
+            else:
+                history = _loads(stored[key]) or []
+            histories[key[len(prefix):]] = window(history)
+        except Exception as e:
+            logger.warning("Failed to read history", key=key, error=str(e))
+    return histories
+
+async def _flush_history_buffers() -> None:
+    """Write every buffer with pending appends back to storage."""
+    for buffer in list(_history_buffers.values()):
+        if buffer.pending:
+            await buffer.flush()
+
+async def _flush_history_periodically(interval_seconds: float = HISTORY_FLUSH_SECONDS) -> None:
+    """Write buffered history appends to storage every interval."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await _flush_history_buffers()
+        except Exception as e:
+            logger.warning("Failed to flush history buffers", error=str(e))
+
+class MetricsSnapshotCache(TTLCache):
+    """Short-lived cache of export payloads shared by concurrent scrapes.
+
+    Scrapers polling within the same window get the same payload, so the
+    metrics collection and history scan run once per window rather than once
+    per caller.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        super().__init__(maxsize=16, ttl=ttl_seconds)
+        self.lock = asyncio.Lock()
+
+    async def get_or_build(self, key: Tuple[str, bool], build) -> Dict[str, Any]:
+        """Return the cached payload for key, building it at most once per window."""
+        payload = self.get(key)
+        if payload is not None:
+            return payload
+        async with self.lock:
+            # Another caller may have rebuilt it while we waited for the lock
+            payload = self.get(key)
+            if payload is None:
+                payload = await build()
+                self.set(key, payload)
+            return payload
+
+METRICS_CACHE_ENABLED = os.getenv("METRICS_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+
+metrics_cache = MetricsSnapshotCache(
+    float(os.getenv("METRICS_CACHE_TTL_SECONDS", "5")) if METRICS_CACHE_ENABLED else 0.0
+)
+
+# Generated reports by (tool name, service name, days); dropped when new metrics arrive
+report_cache = TTLCache(maxsize=256, ttl=float(os.getenv("REPORT_CACHE_TTL_SECONDS", "30")))
+
+PROMETHEUS_PORT = int(os.getenv("PROMETHEUS_PORT", "9090"))
+
+# The prometheus export only points at the scrape endpoint, so it is built once
+# and returned as is; callers must not mutate it
+_PROM_RESPONSE: Dict[str, Any] = {
+    "format": "prometheus",
+    "endpoint": f"http://localhost:{PROMETHEUS_PORT}/metrics",
+    "message": "Metrics available at Prometheus endpoint",
+}
+
 # Global rate limiter
 rate_limiter = RateLimiter(max_calls=50, window_seconds=60)  # 50 calls per minute
 input_validator = InputValidator()
 
 class AnomalyResult(BaseModel):
     """Result of anomaly detection."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     metric_name: str
     detected_at: datetime
     severity: str
@@ -237,15 +762,146 @@ class AnomalyResult(BaseModel):
     threshold_value: float
     historical_average: float
 
+ALERT_CONFIGS_VERSION_KEY = "alert_configs_version"
+
+# Validated alert configs and the storage version they were loaded at
+_alert_cache: Tuple[int, List[AlertConfig]] = (-1, [])
+_alert_cache_storage: Any = None
+
+async def _save_alert_configs(storage: Any, configs: List[AlertConfig]) -> None:
+    """Store alert configs and bump their version so cached copies are reloaded."""
+    version = await storage.get(ALERT_CONFIGS_VERSION_KEY) or 0
+    await storage.set("alert_configs", [config.model_dump() for config in configs])
+    await storage.set(ALERT_CONFIGS_VERSION_KEY, version + 1)
+
+async def _load_alert_configs(ctx: Context) -> List[AlertConfig]:
+    """Return the alert configs, reloading them only when their version changes.
+
+    Stored configs are dumped from validated models by ``_save_alert_configs``,
+    so they are rebuilt with ``model_construct`` instead of being revalidated.
+    """
+    global _alert_cache, _alert_cache_storage
+    version = await ctx.storage.get(ALERT_CONFIGS_VERSION_KEY) or 0
+    if _alert_cache_storage is ctx.storage and _alert_cache[0] == version:
+        return _alert_cache[1]
+
+    alert_configs_raw = await ctx.storage.get("alert_configs") or []
+    configs = [AlertConfig.model_construct(**config) for config in alert_configs_raw]
+    _alert_cache = (version, configs)
+    _alert_cache_storage = ctx.storage
+    return configs
+
+# Latest system-wide CPU percentage, refreshed by the lifespan's background sampler
+_last_cpu_percent: Optional[float] = None
+
+async def _sample_cpu(interval_seconds: float = 1.0) -> None:
+    """Sample CPU usage every interval without blocking the event loop."""
+    global _last_cpu_percent
+    # The first non-blocking call only primes psutil's counters
+    psutil.cpu_percent(interval=None)
+    while True:
+        await asyncio.sleep(interval_seconds)
+        _last_cpu_percent = psutil.cpu_percent(interval=None)
+
+# Whether psutil's CPU counters have been primed for non-blocking reads
+_cpu_primed = False
+
+async def _current_cpu_percent() -> float:
+    """Return the latest CPU percentage.
+
+    Outside the server lifespan there is no sampler. psutil's non-blocking form
+    then reports usage since its previous call, so only the first call has to
+    prime the counters and wait briefly before reading.
+    """
+    global _cpu_primed
+    if _last_cpu_percent is not None:
+        return _last_cpu_percent
+    if not _cpu_primed:
+        psutil.cpu_percent(interval=None)
+        _cpu_primed = True
+        await asyncio.sleep(0.1)
+    return psutil.cpu_percent(interval=None)
+
+SYSTEM_SAMPLE_TTL_SECONDS = float(os.getenv("SYSTEM_SAMPLE_TTL_SECONDS", "1"))
+
+# Latest system snapshot and the monotonic time it was taken
+_system_sample: Tuple[float, Optional[Dict[str, Any]]] = (0.0, None)
+
+async def _sample_system(ttl: float = SYSTEM_SAMPLE_TTL_SECONDS) -> Dict[str, Any]:
+    """Return CPU, memory, disk and network readings, sampled at most once per ``ttl``.
+
+    Bursts of tool calls share one set of psutil calls instead of making
+    their own.
+    """
+    global _system_sample
+    taken_at, sample = _system_sample
+    if sample is not None and time.monotonic() - taken_at < ttl:
+        return sample
+
+    sample = {
+        "cpu_percent": await _current_cpu_percent(),
+        "memory": psutil.virtual_memory(),
+        "disk": psutil.disk_usage('/'),
+        "network": psutil.net_io_counters(),
+    }
+    _system_sample = (time.monotonic(), sample)
+    return sample
+
+def _scan_processes(limit: int = 10) -> Tuple[int, List[Dict], List[Dict]]:
+    """Scan all processes and return the count and the top ``limit`` by CPU and memory.
+
+    Attributes are gathered column-wise in a single pass; process_iter prefetches
+    them and substitutes None for inaccessible values. Only the selected
+    processes are materialized as dicts.
+    """
+    pids, names, cpus, mems = [], [], [], []
+    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+        info = proc.info
+        pids.append(info['pid'])
+        names.append(info['name'])
+        cpus.append(info['cpu_percent'] or 0.0)
+        mems.append(info['memory_percent'] or 0.0)
+
+    def process_entry(i: int) -> Dict[str, Any]:
+        return {'pid': pids[i], 'name': names[i], 'cpu_percent': cpus[i], 'memory_percent': mems[i]}
+
+    top_cpu = [process_entry(i) for i in heapq.nlargest(limit, range(len(pids)), key=cpus.__getitem__)]
+    top_memory = [process_entry(i) for i in heapq.nlargest(limit, range(len(pids)), key=mems.__getitem__)]
+    return len(pids), top_cpu, top_memory
+
+# Shared HTTP session for health checks, opened on first use and closed by the server lifespan
+_http_session: Optional[aiohttp.ClientSession] = None
+
+async def _get_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use.
+
+    Reusing one pooled session keeps connections and cached DNS lookups
+    alive between health checks of the same endpoint.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=200, limit_per_host=32, ttl_dns_cache=300, keepalive_timeout=60
+            )
+        )
+    return _http_session
+
+async def _close_session() -> None:
+    """Close the shared HTTP session if one was opened."""
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
 @asynccontextmanager
 async def server_lifespan(mcp_instance: FastMCP):
     """Server lifespan for startup and cleanup."""
     logger.info("Starting Observability MCP Server")
 
     # Initialize Prometheus metrics server
-    prometheus_port = int(os.getenv("PROMETHEUS_PORT", "9090"))
-    start_http_server(prometheus_port)
-    logger.info("Prometheus metrics server started", port=prometheus_port)
+    start_http_server(PROMETHEUS_PORT)
+    logger.info("Prometheus metrics server started", port=PROMETHEUS_PORT)
 
     # Initialize storage for metrics history
     await mcp_instance.storage.set("server_start_time", time.time())
@@ -257,13 +913,19 @@ async def server_lifespan(mcp_instance: FastMCP):
         AlertConfig(metric_name="memory_mb", threshold=1000.0, operator="gt", severity="error"),
         AlertConfig(metric_name="error_rate", threshold=0.05, operator="gt", severity="error"),
     ]
-    await mcp_instance.storage.set("alert_configs", [alert.dict() for alert in default_alerts])
+    await _save_alert_configs(mcp_instance.storage, default_alerts)
+
+    cpu_sampler = asyncio.create_task(_sample_cpu())
+    history_flusher = asyncio.create_task(_flush_history_periodically())
 
     logger.info("Observability MCP Server startup complete")
     yield
 
     logger.info("Shutting down Observability MCP Server")
-    # Cleanup would go here if needed
+    cpu_sampler.cancel()
+    history_flusher.cancel()
+    await _close_session()
+    await _flush_history_buffers()
 
 # Initialize FastMCP server
 mcp = FastMCP(
@@ -311,31 +973,31 @@ async def monitor_server_health(
 
     start_time = time.time()
 
-    with tracer.start_as_span("health_check") as span:
-        span.set_attribute("service.url", service_url)
-        span.set_attribute("timeout_seconds", timeout_seconds)
+    with tracer.start_as_current_span(
+        "health_check",
+        attributes={"service.url": service_url, "timeout_seconds": timeout_seconds},
+    ) as span:
 
         try:
-            import aiohttp
-
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout_seconds)) as session:
-                async with session.get(service_url) as response:
-                    response_time = (time.time() - start_time) * 1000
-
-                    is_healthy = response.status in expected_status_codes
-                    status = "healthy" if is_healthy else "unhealthy"
-
-                    result = HealthCheckResult(
-                        service_name=service_url,
-                        status=status,
-                        response_time_ms=response_time,
-                        timestamp=datetime.now(),
-                        details={
-                            "status_code": response.status,
-                            "headers": dict(response.headers),
-                            "content_length": len(await response.read()),
-                        }
-                    )
+            session = await _get_session()
+            timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+            async with session.get(service_url, timeout=timeout) as response:
+                response_time = (time.time() - start_time) * 1000
+
+                is_healthy = response.status in expected_status_codes
+                status = "healthy" if is_healthy else "unhealthy"
+
+                result = HealthCheckResult(
+                    service_name=service_url,
+                    status=status,
+                    response_time_ms=response_time,
+                    timestamp=datetime.now(),
+                    details={
+                        "status_code": response.status,
+                        "headers": dict(response.headers),
+                        "content_length": await _response_content_length(response),
+                    }
+                )
 
         except Exception as e:
             response_time = (time.time() - start_time) * 1000
@@ -348,21 +1010,20 @@ async def monitor_server_health(
             )
 
     # Record metrics
-    health_check_counter.add(1, {"status": result.status, "service": service_url})
+    labels = _metric_labels(status=result.status, service_class=_service_class(service_url))
+    health_check_counter.add(1, labels)
+    health_check_duration.record(result.response_time_ms / 1000, labels)
 
-    span.set_attribute("health.status", result.status)
-    span.set_attribute("response_time_ms", result.response_time_ms)
+    span.set_attributes({"health.status": result.status, "response_time_ms": result.response_time_ms})
 
-    # Store result in persistent storage (with bounds checking)
+    # Store result in persistent storage (last 50 results per service)
     history_key = f"health_history:{service_url}"
-    history = await ctx.storage.get(history_key, [])
-    history.append(result.dict())
-    # Keep only last 50 results per service to prevent unbounded growth
-    history = history[-50:]
-    await ctx.storage.set(history_key, history)
+    # Dump once and share the dict between the history entry and the response
+    result_data = result.model_dump(mode="json")
+    history = await _append_bounded(ctx, history_key, result_data, 50)
 
     return {
-        "health_check": result.dict(),
+        "health_check": result_data,
         "metrics_recorded": True,
         "historical_checks": len(history),
         "recommendations": _generate_health_recommendations(result)
@@ -388,18 +1049,21 @@ async def collect_performance_metrics(ctx: Context, service_name: str = "system"
 
     if not input_validator.validate_service_name(service_name):
         return {"error": "Invalid service name provided"}
-    with tracer.start_as_span("collect_performance_metrics") as span:
-        span.set_attribute("service.name", service_name)
+
+    # One collection time for the model, the stored entry and its epoch
+    now = datetime.now()
+    with tracer.start_as_current_span("collect_performance_metrics", attributes={"service.name": service_name}) as span:
 
         # Collect system metrics
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        network = psutil.net_io_counters()
+        sample = await _sample_system()
+        cpu_percent = sample["cpu_percent"]
+        memory = sample["memory"]
+        disk = sample["disk"]
+        network = sample["network"]
 
         metrics_data = PerformanceMetrics(
             service_name=service_name,
-            timestamp=datetime.now(),
+            timestamp=now,
             cpu_percent=cpu_percent,
             memory_mb=memory.used / (1024 * 1024),
             disk_usage_percent=disk.percent,
@@ -415,26 +1079,27 @@ async def collect_performance_metrics(ctx: Context, service_name: str = "system"
         cpu_usage_gauge.set(int(cpu_percent))
         memory_usage_gauge.set(int(metrics_data.memory_mb))
 
-        performance_metric_counter.add(1, {"service": service_name})
+        performance_metric_counter.add(1, _metric_labels(service=service_name))
 
-        # Store metrics history (with bounds checking)
+        # Store metrics history (last PERFORMANCE_HISTORY_LIMIT data points per service)
         history_key = f"performance_history:{service_name}"
-        history = await ctx.storage.get(history_key, [])
-        history.append(metrics_data.dict())
-        # Keep last 500 data points per service to prevent unbounded growth
-        history = history[-500:]
-        await ctx.storage.set(history_key, history)
+        metrics_dict = metrics_data.model_dump(mode="json")
+        entry = {**metrics_dict, "ts_epoch": now.timestamp()}
+        history = await _append_performance(ctx, history_key, entry, PERFORMANCE_HISTORY_LIMIT)
+
+        # Reports for this service and for all services no longer reflect the history
+        report_cache.pop(("generate_performance_reports", service_name))
+        report_cache.pop(("generate_performance_reports", None))
 
         # Analyze trends
         trends = _analyze_performance_trends(history)
 
-        span.set_attribute("cpu_percent", cpu_percent)
-        span.set_attribute("memory_mb", metrics_data.memory_mb)
+        span.set_attributes({"cpu_percent": cpu_percent, "memory_mb": metrics_data.memory_mb})
 
         return {
-            "metrics": metrics_data.dict(),
+            "metrics": metrics_dict,
             "trends": trends,
-            "alerts": await _check_performance_alerts(ctx, metrics_data),
+            "alerts": _check_performance_alerts(ctx, metrics_data),
             "recommendations": _generate_performance_recommendations(metrics_data, trends)
         }
 
@@ -488,39 +1153,37 @@ async def trace_mcp_calls(
         if not isinstance(value, (str, int, float, bool)):
             return {"error": "Invalid attribute value type"}
 
-    with tracer.start_as_span(operation_name) as span:
-        span.set_attribute("service.name", service_name)
-        span.set_attribute("operation.duration_ms", duration_ms)
-
-        for key, value in attributes.items():
-            span.set_attribute(f"operation.{key}", value)
+    # All span attributes are known up front, so set them at creation in one call
+    span_attributes = {f"operation.{key}": value for key, value in attributes.items()}
+    span_attributes["service.name"] = service_name
+    span_attributes["operation.duration_ms"] = duration_ms
 
+    with tracer.start_as_current_span(operation_name, attributes=span_attributes) as span:
+        now = datetime.now()
         trace_info = TraceInfo(
-            trace_id=span.get_span_context().trace_id,
+            trace_id=trace.format_trace_id(span.get_span_context().trace_id),
             service_name=service_name,
             operation=operation_name,
-            start_time=datetime.now(),
+            start_time=now,
             duration_ms=duration_ms,
             status="completed",
             attributes=attributes
         )
 
     # Record metrics
-    trace_counter.add(1, {"service": service_name, "operation": operation_name})
+    trace_counter.add(1, _metric_labels(service=service_name))
 
-    # Store trace history (with bounds checking)
+    # Store trace history (last TRACE_HISTORY_LIMIT traces per service)
     history_key = f"trace_history:{service_name}"
-    history = await ctx.storage.get(history_key, [])
-    history.append(trace_info.dict())
-    # Keep last 200 traces per service to prevent unbounded growth
-    history = history[-200:]
-    await ctx.storage.set(history_key, history)
+    trace_dict = trace_info.model_dump(mode="json")
+    entry = {**trace_dict, "ts_epoch": now.timestamp()}
+    history = await _append_trace(ctx, history_key, entry, TRACE_HISTORY_LIMIT)
 
-    # Analyze trace patterns
-    patterns = _analyze_trace_patterns(history)
+    # Analyze trace patterns from the counts maintained at ingest
+    patterns = _analyze_trace_patterns(history, _buffered_operation_counts(ctx, history_key))
 
     return {
-        "trace": trace_info.dict(),
+        "trace": trace_dict,
         "patterns": patterns,
         "performance_insights": _generate_trace_insights(trace_info, patterns)
     }
@@ -550,60 +1213,57 @@ async def generate_performance_reports(ctx: Context, service_name: str = None, d
     if not input_validator.validate_days(days):
         return {"error": "Invalid days parameter"}
 
-    with tracer.start_as_span("generate_performance_reports") as span:
-        span.set_attribute("report.days", days)
-        if service_name:
-            span.set_attribute("report.service", service_name)
+    cache_key = ("generate_performance_reports", service_name, days)
+    if METRICS_CACHE_ENABLED:
+        cached_report = report_cache.get(cache_key)
+        if cached_report is not None:
+            return cached_report
 
-        cutoff_date = datetime.now() - timedelta(days=days)
+    span_attributes = {"report.days": days}
+    if service_name:
+        span_attributes["report.service"] = service_name
 
+    # One report time for the window cutoff, the report and its storage key
+    now = datetime.now()
+    with tracer.start_as_current_span("generate_performance_reports", attributes=span_attributes) as span:
+
+        cutoff_epoch = (now - timedelta(days=days)).timestamp()
         if service_name:
             # Analyze specific service
             history_key = f"performance_history:{service_name}"
-            history = await ctx.storage.get(history_key, [])
-
-            # Filter by date
-            recent_history = [
-                item for item in history
-                if datetime.fromisoformat(item["timestamp"]) > cutoff_date
-            ]
+            stats = _buffered_stats(ctx, history_key, cutoff_epoch)
+            if stats is None:
+                # Filter by date and scan the entries once
+                history = await _load_history(ctx, history_key)
+                stats = _scan_history([item for item in history if _entry_epoch(item) > cutoff_epoch])
+            metrics_count = stats.count
         else:
-            # Analyze all services
-            all_history = {}
-            storage_keys = await ctx.storage.keys()
-            perf_keys = [k for k in storage_keys if k.startswith("performance_history:")]
-
-            for key in perf_keys:
-                service = key.replace("performance_history:", "")
-                history = await ctx.storage.get(key, [])
-                recent = [
-                    item for item in history
-                    if datetime.fromisoformat(item["timestamp"]) > cutoff_date
-                ]
-                if recent:
-                    all_history[service] = recent
-
-            recent_history = all_history
-
-        if not recent_history:
+            # Analyze all services, scanning each history once
+            all_history = await _mget_history(ctx, "performance_history:", cutoff_epoch)
+            stats = {service: _scan_history(recent) for service, recent in all_history.items() if recent}
+            metrics_count = sum(service_stats.count for service_stats in stats.values())
+
+        if not metrics_count:
             return {"error": "No performance data available for the specified period"}
 
-        # Generate report
+        # Every report section is derived from the aggregates
         report = {
             "period_days": days,
-            "generated_at": datetime.now().isoformat(),
-            "summary": _generate_performance_summary(recent_history, service_name),
-            "trends": _analyze_performance_trends_detailed(recent_history, service_name),
-            "anomalies": await _detect_performance_anomalies(ctx, recent_history, service_name),
-            "recommendations": _generate_performance_recommendations_from_history(recent_history, service_name)
+            "generated_at": now.isoformat(),
+            "summary": _generate_performance_summary(stats, service_name),
+            "trends": _analyze_performance_trends_detailed(stats, service_name),
+            "anomalies": _detect_performance_anomalies(ctx, stats, service_name),
+            "recommendations": _generate_performance_recommendations_from_history(stats, service_name)
         }
 
         # Store report
-        report_key = f"report:{service_name or 'all'}:{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        await ctx.storage.set(report_key, report)
+        report_key = f"report:{service_name or 'all'}:{now.strftime('%Y%m%d_%H%M%S')}"
+        await _storage_set(ctx, report_key, report)
 
-        span.set_attribute("report.metrics_count", len(recent_history) if isinstance(recent_history, list) else sum(len(h) for h in recent_history.values()))
+        span.set_attribute("report.metrics_count", metrics_count)
 
+        if METRICS_CACHE_ENABLED:
+            report_cache.set(cache_key, report)
         return report
 
 @mcp.tool()
@@ -620,29 +1280,23 @@ async def alert_on_anomalies(ctx: Context, service_name: str = None) -> Dict[str
     Returns:
         Current alerts and anomaly detection results
     """
-    with tracer.start_as_span("alert_on_anomalies") as span:
-        if service_name:
-            span.set_attribute("alert.service", service_name)
+    span_attributes = {"alert.service": service_name} if service_name else None
+    with tracer.start_as_current_span("alert_on_anomalies", attributes=span_attributes) as span:
 
         # Get alert configurations
-        alert_configs_raw = await ctx.storage.get("alert_configs", [])
-        alert_configs = [AlertConfig(**config) for config in alert_configs_raw]
+        alert_configs = await _load_alert_configs(ctx)
+        alert_rules = _compile_alert_rules(alert_configs)
 
         anomalies = []
         active_alerts = []
 
         if service_name:
-            services_to_check = [service_name]
+            histories = {service_name: await _load_history(ctx, f"performance_history:{service_name}")}
         else:
             # Get all services with performance history
-            storage_keys = await ctx.storage.keys()
-            perf_keys = [k for k in storage_keys if k.startswith("performance_history:")]
-            services_to_check = [k.replace("performance_history:", "") for k in perf_keys]
-
-        for svc in services_to_check:
-            history_key = f"performance_history:{svc}"
-            history = await ctx.storage.get(history_key, [])
+            histories = await _mget_history(ctx, "performance_history:")
 
+        for svc, history in histories.items():
             if not history:
                 continue
 
@@ -651,19 +1305,18 @@ async def alert_on_anomalies(ctx: Context, service_name: str = None) -> Dict[str
             anomalies.extend(service_anomalies)
 
             # Check active alerts
-            service_alerts = await _check_active_alerts(ctx, svc, history, alert_configs)
+            service_alerts = await _check_active_alerts(ctx, svc, history, alert_rules)
             active_alerts.extend(service_alerts)
 
         # Record metrics
-        alert_counter.add(len(active_alerts), {"type": "active"})
+        alert_counter.add(len(active_alerts), _metric_labels(type="active"))
 
-        span.set_attribute("alerts.active", len(active_alerts))
-        span.set_attribute("anomalies.detected", len(anomalies))
+        span.set_attributes({"alerts.active": len(active_alerts), "anomalies.detected": len(anomalies)})
 
         return {
             "active_alerts": active_alerts,
-            "detected_anomalies": [anomaly.dict() for anomaly in anomalies],
-            "alert_configs": [config.dict() for config in alert_configs],
+            "detected_anomalies": [anomaly.model_dump(mode="json") for anomaly in anomalies],
+            "alert_configs": [config.model_dump() for config in alert_configs],
             "recommendations": _generate_alert_recommendations(active_alerts, anomalies)
         }
 
@@ -682,36 +1335,24 @@ async def monitor_system_resources(ctx: Context) -> Dict[str, Any]:
     if not rate_limiter.is_allowed("system_resources"):
         return {"error": "Rate limit exceeded. System monitoring is restricted."}
 
-    with tracer.start_as_span("monitor_system_resources") as span:
+    now = datetime.now()
+    with tracer.start_as_current_span("monitor_system_resources") as span:
 
         # System-wide metrics
+        sample = await _sample_system()
         cpu_times = psutil.cpu_times()
-        memory = psutil.virtual_memory()
+        memory = sample["memory"]
         swap = psutil.swap_memory()
-        disk = psutil.disk_usage('/')
-        network = psutil.net_io_counters()
-
-        # Process information
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-            try:
-                processes.append({
-                    'pid': proc.pid,
-                    'name': proc.name(),
-                    'cpu_percent': proc.cpu_percent(),
-                    'memory_percent': proc.memory_percent()
-                })
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+        disk = sample["disk"]
+        network = sample["network"]
 
-        # Top 10 processes by CPU and memory
-        top_cpu = sorted(processes, key=lambda x: x['cpu_percent'], reverse=True)[:10]
-        top_memory = sorted(processes, key=lambda x: x['memory_percent'], reverse=True)[:10]
+        # Walking /proc is blocking I/O, so scan processes in a worker thread
+        process_count, top_cpu, top_memory = await asyncio.to_thread(_scan_processes)
 
         system_status = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
             "cpu": {
-                "percent": psutil.cpu_percent(interval=1),
+                "percent": sample["cpu_percent"],
                 "cores": psutil.cpu_count(),
                 "cores_logical": psutil.cpu_count(logical=True),
                 "times": {
@@ -744,26 +1385,23 @@ async def monitor_system_resources(ctx: Context) -> Dict[str, Any]:
                 "packets_recv": network.packets_recv,
             },
             "processes": {
-                "total": len(processes),
+                "total": process_count,
                 "top_cpu": top_cpu,
                 "top_memory": top_memory,
             }
         }
 
-        # Store system status (with bounds checking)
-        history_key = "system_status_history"
-        history = await ctx.storage.get(history_key, [])
-        history.append(system_status)
-        # Keep last 50 system status snapshots to prevent unbounded growth
-        history = history[-50:]
-        await ctx.storage.set(history_key, history)
+        # Store system status (last 50 snapshots)
+        history = await _append_bounded(ctx, "system_status_history", system_status, 50)
 
         # Analyze system health
         health_analysis = _analyze_system_health(system_status)
 
-        span.set_attribute("cpu.percent", system_status["cpu"]["percent"])
-        span.set_attribute("memory.percent", system_status["memory"]["percent"])
-        span.set_attribute("disk.percent", system_status["disk"]["percent"])
+        span.set_attributes({
+            "cpu.percent": system_status["cpu"]["percent"],
+            "memory.percent": system_status["memory"]["percent"],
+            "disk.percent": system_status["disk"]["percent"],
+        })
 
         return {
             "system_status": system_status,
@@ -793,34 +1431,26 @@ async def analyze_mcp_interactions(ctx: Context, days: int = 7) -> Dict[str, Any
     if not input_validator.validate_days(days):
         return {"error": "Invalid days parameter"}
 
-    with tracer.start_as_span("analyze_mcp_interactions") as span:
-        span.set_attribute("analysis.days", days)
+    with tracer.start_as_current_span("analyze_mcp_interactions", attributes={"analysis.days": days}) as span:
 
-        cutoff_date = datetime.now() - timedelta(days=days)
+        cutoff_epoch = (datetime.now() - timedelta(days=days)).timestamp()
 
-        # Collect trace data from all services
-        storage_keys = await ctx.storage.keys()
-        trace_keys = [k for k in storage_keys if k.startswith("trace_history:")]
+        # Collect trace data from all services, filtered by date
+        traces_by_service = await _mget_history(ctx, "trace_history:", cutoff_epoch)
 
         all_traces = []
         service_stats = {}
+        hour_counts = [0] * 24
 
-        for key in trace_keys:
-            service_name = key.replace("trace_history:", "")
-            traces = await ctx.storage.get(key, [])
-
-            # Filter by date and collect
-            recent_traces = [
-                trace for trace in traces
-                if datetime.fromisoformat(trace["timestamp"]) > cutoff_date
-            ]
-
+        for service_name, recent_traces in traces_by_service.items():
             all_traces.extend(recent_traces)
-            service_stats[service_name] = {
-                "total_calls": len(recent_traces),
-                "avg_duration": sum(t["duration_ms"] for t in recent_traces) / len(recent_traces) if recent_traces else 0,
-                "error_rate": sum(1 for t in recent_traces if t.get("status") != "completed") / len(recent_traces) if recent_traces else 0,
-            }
+            # Reuse the ingest-time histogram when the window kept every buffered trace
+            service_hours = _buffered_hour_counts(
+                ctx, f"trace_history:{service_name}", len(recent_traces)
+            ) or _count_hours(recent_traces)
+            for hour, count in enumerate(service_hours):
+                hour_counts[hour] += count
+            service_stats[service_name] = _summarize_service_traces(recent_traces)
 
         if not all_traces:
             return {"error": "No interaction data available for the specified period"}
@@ -829,7 +1459,7 @@ async def analyze_mcp_interactions(ctx: Context, days: int = 7) -> Dict[str, Any
         patterns = {
             "total_interactions": len(all_traces),
             "unique_services": len(service_stats),
-            "peak_hours": _find_peak_usage_hours(all_traces),
+            "peak_hours": _find_peak_usage_hours(hour_counts),
             "slowest_operations": _find_slowest_operations(all_traces),
             "error_patterns": _analyze_error_patterns(all_traces),
             "service_comparison": service_stats,
@@ -843,8 +1473,10 @@ async def analyze_mcp_interactions(ctx: Context, days: int = 7) -> Dict[str, Any
             "usage_trends": _analyze_usage_trends(all_traces),
         }
 
-        span.set_attribute("analysis.total_interactions", len(all_traces))
-        span.set_attribute("analysis.services_count", len(service_stats))
+        span.set_attributes({
+            "analysis.total_interactions": len(all_traces),
+            "analysis.services_count": len(service_stats),
+        })
 
         return {
             "analysis_period_days": days,
@@ -854,7 +1486,12 @@ async def analyze_mcp_interactions(ctx: Context, days: int = 7) -> Dict[str, Any
         }
 
 @mcp.tool()
-async def export_metrics(ctx: Context, format: str = "prometheus", include_history: bool = False) -> Dict[str, Any]:
+async def export_metrics(
+    ctx: Context,
+    format: str = "prometheus",
+    include_history: bool = False,
+    stream: bool = False
+) -> Dict[str, Any]:
     """
     Export collected metrics in various formats for external monitoring systems.
 
@@ -864,6 +1501,8 @@ async def export_metrics(ctx: Context, format: str = "prometheus", include_histo
     Args:
         format: Export format (prometheus, opentelemetry, json)
         include_history: Whether to include historical data
+        stream: For the json format, write the export to a file under EXPORT_DIR
+            one history key at a time and return its server-local path instead of the data
 
     Returns:
         Exported metrics in the requested format
@@ -876,50 +1515,119 @@ async def export_metrics(ctx: Context, format: str = "prometheus", include_histo
     if format not in allowed_formats:
         return {"error": f"Invalid format. Must be one of: {allowed_formats}"}
 
-    with tracer.start_as_span("export_metrics") as span:
-        span.set_attribute("export.format", format)
-        span.set_attribute("export.include_history", include_history)
+    if format == "prometheus":
+        # Prometheus format is handled by the OpenTelemetry exporter
+        return _PROM_RESPONSE
 
-        if format == "prometheus":
-            # Prometheus format is handled by the OpenTelemetry exporter
-            return {
-                "format": "prometheus",
-                "endpoint": f"http://localhost:{os.getenv('PROMETHEUS_PORT', '9090')}/metrics",
-                "message": "Metrics available at Prometheus endpoint"
-            }
+    with tracer.start_as_current_span(
+        "export_metrics",
+        attributes={"export.format": format, "export.include_history": include_history},
+    ):
+        if stream and format == "json":
+            return {"format": "json", "path": await _stream_json_export(ctx, include_history)}
 
-        elif format == "opentelemetry":
-            # Export current metrics in OTLP format
-            return {
-                "format": "opentelemetry",
-                "metrics": _collect_current_metrics(),
-                "traces": _collect_recent_traces(ctx) if include_history else None
-            }
+        return await metrics_cache.get_or_build(
+            (format, include_history),
+            lambda: _build_export_payload(ctx, format, include_history),
+        )
 
-        elif format == "json":
-            # Export as JSON
-            export_data = {
-                "timestamp": datetime.now().isoformat(),
-                "metrics": _collect_current_metrics(),
-                "version": "0.1.0"
-            }
+async def _build_export_payload(ctx: Context, format: str, include_history: bool) -> Dict[str, Any]:
+    """Build an opentelemetry or json export payload."""
+    if format == "opentelemetry":
+        # Export current metrics in OTLP format
+        return {
+            "format": "opentelemetry",
+            "metrics": _collect_current_metrics(),
+            "traces": _collect_recent_traces(ctx) if include_history else None
+        }
 
-            if include_history:
-                # Include recent history (with strict limits to prevent data exfiltration)
-                storage_keys = await ctx.storage.keys()
-                history_keys = [k for k in storage_keys if "_history:" in k]
+    # Export as JSON
+    export_data = {
+        "format": "json",
+        "timestamp": datetime.now().isoformat(),
+        "metrics": _collect_current_metrics(),
+        "version": "0.1.0"
+    }
 
-                export_data["history"] = {}
-                for key in history_keys[:5]:  # Limit to 5 history keys for security
-                    history = await ctx.storage.get(key, [])
-                    export_data["history"][key] = history[-20:]  # Last 20 entries only
+    if include_history:
+        # Include recent history (with strict limits to prevent data exfiltration)
+        history_keys = [
+            key for prefix in HISTORY_PREFIXES for key in await _indexed_keys(ctx, prefix)
+        ]
+
+        export_data["history"] = {}
+        for key in history_keys[:5]:  # Limit to 5 history keys for security
+            history = await _load_history(ctx, key)
+            export_data["history"][key] = history[-20:]  # Last 20 entries only
+
+    return export_data
+
+EXPORT_DIR = os.getenv("EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "observability-mcp-exports")
+MAX_EXPORT_FILES = max(1, int(os.getenv("MAX_EXPORT_FILES", "5")))
+
+def _prune_exports(keep: int) -> None:
+    """Delete the oldest streamed exports so that at most ``keep`` remain."""
+    with os.scandir(EXPORT_DIR) as entries:
+        exports = [
+            (entry.stat().st_mtime, entry.path) for entry in entries
+            if entry.name.startswith("observability-export-") and entry.name.endswith(".json")
+        ]
+    exports.sort()
+    for _, path in exports[:max(0, len(exports) - keep)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
 
-            return export_data
+async def _stream_json_export(ctx: Context, include_history: bool) -> str:
+    """Write a json export to a file under ``EXPORT_DIR`` and return its path.
 
-        else:
-            return {"error": f"Unsupported format: {format}. Supported: prometheus, opentelemetry, json"}
+    The document is written as fragments, one history key at a time, so only a
+    single history list is held in memory alongside the open file. The same
+    key and entry limits as the in-memory export apply. Only the newest
+    ``MAX_EXPORT_FILES`` exports are kept; the path is local to the server host.
+    """
+    header = _dumps({
+        "format": "json",
+        "timestamp": datetime.now().isoformat(),
+        "metrics": _collect_current_metrics(),
+        "version": "0.1.0"
+    })
+    await asyncio.to_thread(os.makedirs, EXPORT_DIR, 0o700, True)
+    # Make room for the new file before creating it
+    await asyncio.to_thread(_prune_exports, MAX_EXPORT_FILES - 1)
+    fd, path = tempfile.mkstemp(prefix="observability-export-", suffix=".json", dir=EXPORT_DIR)
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        if not include_history:
+            await asyncio.to_thread(handle.write, header)
+            return path
+
+        # Reopen the header object to append the history mapping
+        await asyncio.to_thread(handle.write, header[:-1] + ',"history":{')
+        history_keys = [
+            key for prefix in HISTORY_PREFIXES for key in await _indexed_keys(ctx, prefix)
+        ]
+        for index, key in enumerate(history_keys[:5]):
+            history = await _load_history(ctx, key)
+            fragment = f"{',' if index else ''}{_dumps(key)}:{_dumps(history[-20:])}"
+            await asyncio.to_thread(handle.write, fragment)
+        await asyncio.to_thread(handle.write, "}}")
+    return path
 
 # Helper functions
+async def _response_content_length(response: Any) -> int:
+    """Return the body size from Content-Length, or by streaming and discarding the body."""
+    header = response.headers.get("Content-Length")
+    if header is not None:
+        try:
+            return int(header)
+        except ValueError:
+            pass
+    total = 0
+    async for chunk in response.content.iter_chunked(65536):
+        total += len(chunk)
+    return total
+
 def _generate_health_recommendations(result: HealthCheckResult) -> List[str]:
     """Generate health check recommendations."""
     recommendations = []
@@ -940,17 +1648,27 @@ def _analyze_performance_trends(history: List[Dict]) -> Dict[str, Any]:
     if len(history) < 2:
         return {"insufficient_data": True}
 
-    recent = history[-10:]  # Last 10 data points
-    cpu_avg = sum(h.get("cpu_percent", 0) for h in recent) / len(recent)
-    memory_avg = sum(h.get("memory_mb", 0) for h in recent) / len(recent)
+    # Last 10 data points, oldest first; works for both lists and buffered deques
+    cpu, memory = [], []
+    for h in reversed(list(islice(reversed(history), 10))):
+        cpu.append(h.get("cpu_percent", 0))
+        memory.append(h.get("memory_mb", 0))
+
+    cpu_avg, memory_avg, cpu_rising, memory_rising = _trend_kernel(cpu, memory)
 
     return {
-        "cpu_trend": "increasing" if recent[-1]["cpu_percent"] > cpu_avg else "stable",
-        "memory_trend": "increasing" if recent[-1]["memory_mb"] > memory_avg else "stable",
+        "cpu_trend": "increasing" if cpu_rising else "stable",
+        "memory_trend": "increasing" if memory_rising else "stable",
         "avg_cpu_percent": cpu_avg,
         "avg_memory_mb": memory_avg,
     }
 
+def _trend_kernel(cpu: List[float], memory: List[float]) -> Tuple[float, float, bool, bool]:
+    """Return CPU/memory averages and whether the latest value is above each average."""
+    cpu_avg = sum(cpu) / len(cpu)
+    memory_avg = sum(memory) / len(memory)
+    return cpu_avg, memory_avg, cpu[-1] > cpu_avg, memory[-1] > memory_avg
+
 def _check_performance_alerts(ctx: Context, metrics: PerformanceMetrics) -> List[Dict]:
     """Check for performance alerts."""
     # Placeholder - would implement actual alert checking
@@ -971,18 +1689,17 @@ def _generate_performance_recommendations(metrics: PerformanceMetrics, trends: D
 
     return recommendations
 
-def _analyze_trace_patterns(history: List[Dict]) -> Dict[str, Any]:
-    """Analyze trace patterns."""
+def _analyze_trace_patterns(history: List[Dict], operations: Optional[Counter] = None) -> Dict[str, Any]:
+    """Analyze trace patterns, counting operations unless counts are given."""
     if not history:
         return {}
 
-    operations = {}
-    for trace in history:
-        op = trace.get("operation", "unknown")
-        operations[op] = operations.get(op, 0) + 1
+    if operations is None:
+        operations = Counter(trace.get("operation", "unknown") for trace in history)
 
+    # Break count ties by name so maintained and recounted Counters rank alike
     return {
-        "most_common_operations": sorted(operations.items(), key=lambda x: x[1], reverse=True)[:5],
+        "most_common_operations": heapq.nsmallest(5, operations.items(), key=lambda item: (-item[1], item[0])),
         "total_operations": len(operations),
     }
 
@@ -999,34 +1716,133 @@ def _generate_trace_insights(trace: TraceInfo, patterns: Dict) -> List[str]:
 
     return insights
 
-def _generate_performance_summary(history: Any, service_name: str = None) -> Dict[str, Any]:
+class HistoryStats:
+    """Aggregates of one performance history, gathered in a single pass.
+
+    The report helpers derive their sections from these sums instead of each
+    walking the history again. Peaks are kept so their z-scores can be taken
+    against the final mean and deviation without a second pass.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum_cpu = self.sumsq_cpu = self.max_cpu = 0.0
+        self.sum_mem = self.sumsq_mem = self.max_mem = 0.0
+        self.min_ts: Optional[float] = None
+        self.max_ts: Optional[float] = None
+        self.first_timestamp: Optional[str] = None
+        self.last_timestamp: Optional[str] = None
+
+    def mean(self, field: str) -> float:
+        """Return the mean of ``cpu`` or ``mem``."""
+        return getattr(self, f"sum_{field}") / self.count
+
+    def stddev(self, field: str) -> float:
+        """Return the population standard deviation of ``cpu`` or ``mem``."""
+        mean = self.mean(field)
+        # Population deviation from the running sums; clamp rounding error below zero
+        return math.sqrt(max(0.0, getattr(self, f"sumsq_{field}") / self.count - mean * mean))
+
+    def peak_z_score(self, field: str) -> float:
+        """Return how many deviations the peak of ``cpu`` or ``mem`` lies above its mean."""
+        stddev = self.stddev(field)
+        return (getattr(self, f"max_{field}") - self.mean(field)) / stddev if stddev else 0.0
+
+def _scan_history(history: List[Dict]) -> HistoryStats:
+    """Accumulate the report aggregates of a performance history in one pass."""
+    stats = HistoryStats()
+    if not history:
+        return stats
+
+    min_ts = max_ts = _entry_epoch(history[0])
+    sum_cpu = sumsq_cpu = sum_mem = sumsq_mem = 0.0
+    max_cpu = max_mem = float("-inf")
+    for h in history:
+        cpu = h.get("cpu_percent", 0)
+        mem = h.get("memory_mb", 0)
+        sum_cpu += cpu
+        sumsq_cpu += cpu * cpu
+        sum_mem += mem
+        sumsq_mem += mem * mem
+        if cpu > max_cpu:
+            max_cpu = cpu
+        if mem > max_mem:
+            max_mem = mem
+        ts = _entry_epoch(h)
+        if ts < min_ts:
+            min_ts = ts
+        elif ts > max_ts:
+            max_ts = ts
+
+    stats.count = len(history)
+    stats.sum_cpu, stats.sumsq_cpu, stats.max_cpu = sum_cpu, sumsq_cpu, max_cpu
+    stats.sum_mem, stats.sumsq_mem, stats.max_mem = sum_mem, sumsq_mem, max_mem
+    stats.min_ts, stats.max_ts = min_ts, max_ts
+    stats.first_timestamp = history[0]["timestamp"]
+    stats.last_timestamp = history[-1]["timestamp"]
+    return stats
+
+def _generate_performance_summary(stats: Any, service_name: str = None) -> Dict[str, Any]:
     """Generate performance summary."""
-    if isinstance(history, list):
+    if isinstance(stats, HistoryStats):
         # Single service
-        if not history:
+        if not stats.count:
             return {"error": "No data available"}
         return {
-            "total_measurements": len(history),
-            "avg_cpu": sum(h.get("cpu_percent", 0) for h in history) / len(history),
-            "avg_memory": sum(h.get("memory_mb", 0) for h in history) / len(history),
-            "time_range": f"{history[0]['timestamp']} to {history[-1]['timestamp']}",
+            "total_measurements": stats.count,
+            "avg_cpu": stats.mean("cpu"),
+            "avg_memory": stats.mean("mem"),
+            "time_range": f"{stats.first_timestamp} to {stats.last_timestamp}",
         }
     else:
         # Multiple services
         summary = {}
-        for svc, data in history.items():
+        for svc, data in stats.items():
             summary[svc] = _generate_performance_summary(data, svc)
         return summary
 
-def _analyze_performance_trends_detailed(history: Any, service_name: str = None) -> Dict[str, Any]:
+def _analyze_performance_trends_detailed(stats: Any, service_name: str = None) -> Dict[str, Any]:
     """Detailed trend analysis."""
-    return {"detailed_analysis": "Implemented in full version"}
+    if not isinstance(stats, HistoryStats):
+        return {svc: _analyze_performance_trends_detailed(data, svc) for svc, data in stats.items()}
+    if not stats.count:
+        return {"insufficient_data": True}
+
+    return {
+        "cpu_stddev": stats.stddev("cpu"),
+        "memory_stddev": stats.stddev("mem"),
+        "peak_cpu": stats.max_cpu,
+        "peak_memory": stats.max_mem,
+        "span_hours": (stats.max_ts - stats.min_ts) / 3600,
+    }
+
+ANOMALY_Z_SCORE = 3.0
+# A peak's population z-score cannot exceed sqrt(n - 1), so shorter histories
+# could never reach ANOMALY_Z_SCORE; they are skipped rather than scored
+ANOMALY_MIN_SAMPLES = math.ceil(ANOMALY_Z_SCORE ** 2) + 1
 
-def _detect_performance_anomalies(ctx: Context, history: Any, service_name: str = None) -> List[Dict]:
+def _detect_performance_anomalies(ctx: Context, stats: Any, service_name: str = None) -> List[Dict]:
     """Detect performance anomalies."""
-    return []
+    by_service = {service_name: stats} if isinstance(stats, HistoryStats) else stats
+
+    # Flag metrics whose peak lies far above the mean of its history
+    anomalies = []
+    for service, service_stats in by_service.items():
+        if service_stats.count < ANOMALY_MIN_SAMPLES:
+            continue
+        for metric_name, field in (("cpu_percent", "cpu"), ("memory_mb", "mem")):
+            z_score = service_stats.peak_z_score(field)
+            if z_score >= ANOMALY_Z_SCORE:
+                anomalies.append({
+                    "service": service,
+                    "metric_name": metric_name,
+                    "peak": getattr(service_stats, f"max_{field}"),
+                    "mean": service_stats.mean(field),
+                    "z_score": z_score,
+                })
+    return anomalies
 
-def _generate_performance_recommendations_from_history(history: Any, service_name: str = None) -> List[str]:
+def _generate_performance_recommendations_from_history(stats: Any, service_name: str = None) -> List[str]:
     """Generate recommendations from historical data."""
     return ["Monitor trends regularly", "Set up alerting for critical metrics"]
 
@@ -1034,7 +1850,28 @@ async def _detect_service_anomalies(ctx: Context, service: str, history: List, c
     """Detect anomalies for a specific service."""
     return []
 
-async def _check_active_alerts(ctx: Context, service: str, history: List, configs: List[AlertConfig]) -> List[Dict]:
+_ALERT_OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    "gt": operator.gt,
+    "lt": operator.lt,
+    "eq": operator.eq,
+    "ne": operator.ne,
+}
+
+AlertRules = Dict[str, List[Tuple[Callable[[float, float], bool], AlertConfig]]]
+
+def _compile_alert_rules(configs: List[AlertConfig]) -> AlertRules:
+    """Group enabled alert configs by metric with their comparison resolved.
+
+    Compiled once per evaluation, so checking a sample only visits the metrics
+    that have rules and never re-dispatches on the operator string.
+    """
+    rules: AlertRules = {}
+    for config in configs:
+        if config.enabled:
+            rules.setdefault(config.metric_name, []).append((_ALERT_OPERATORS[config.operator], config))
+    return rules
+
+async def _check_active_alerts(ctx: Context, service: str, history: List, rules: AlertRules) -> List[Dict]:
     """Check for active alerts."""
     return []
 
@@ -1042,24 +1879,33 @@ def _generate_alert_recommendations(alerts: List, anomalies: List) -> List[str]:
     """Generate alert recommendations."""
     return ["Review alert configurations", "Set up notification channels"]
 
+# Health score penalties: usage above breakpoints[i] costs penalties[i + 1]
+_CPU_BREAKPOINTS, _CPU_PENALTIES = (70, 90), (0, 10, 30)
+_MEMORY_BREAKPOINTS, _MEMORY_PENALTIES = (80, 90), (0, 15, 30)
+_DISK_BREAKPOINTS, _DISK_PENALTIES = (85, 95), (0, 10, 25)
+
+def _health_score(cpu_percent: float, memory_percent: float, disk_percent: float) -> int:
+    """Score system health from usage percentages, starting from 100."""
+    # bisect_left counts the breakpoints strictly below the value, i.e. thresholds exceeded
+    return (
+        100
+        - _CPU_PENALTIES[bisect_left(_CPU_BREAKPOINTS, cpu_percent)]
+        - _MEMORY_PENALTIES[bisect_left(_MEMORY_BREAKPOINTS, memory_percent)]
+        - _DISK_PENALTIES[bisect_left(_DISK_BREAKPOINTS, disk_percent)]
+    )
+
+def _replay_health_scores(history: List[Dict]) -> List[int]:
+    """Recompute the health score of every stored system snapshot."""
+    return [
+        max(0, _health_score(s["cpu"]["percent"], s["memory"]["percent"], s["disk"]["percent"]))
+        for s in history
+    ]
+
 def _analyze_system_health(status: Dict) -> Dict[str, Any]:
     """Analyze system health."""
-    health_score = 100
-
-    if status["cpu"]["percent"] > 90:
-        health_score -= 30
-    elif status["cpu"]["percent"] > 70:
-        health_score -= 10
-
-    if status["memory"]["percent"] > 90:
-        health_score -= 30
-    elif status["memory"]["percent"] > 80:
-        health_score -= 15
-
-    if status["disk"]["percent"] > 95:
-        health_score -= 25
-    elif status["disk"]["percent"] > 85:
-        health_score -= 10
+    health_score = _health_score(
+        status["cpu"]["percent"], status["memory"]["percent"], status["disk"]["percent"]
+    )
 
     return {
         "overall_score": max(0, health_score),
@@ -1083,27 +1929,64 @@ def _generate_system_recommendations(status: Dict, health: Dict) -> List[str]:
     return recommendations
 
 def _analyze_system_trends(history: List) -> Dict[str, Any]:
-    """Analyze system trends."""
-    return {"trend_analysis": "Implemented in full version"}
+    """Analyze system trends from the health scores of the stored snapshots."""
+    scores = _replay_health_scores(history)
+    return {
+        "health_score_min": min(scores),
+        "health_score_avg": sum(scores) / len(scores),
+        "health_score_change": scores[-1] - scores[0],
+    }
+
+def _summarize_service_traces(traces: List) -> Dict[str, Any]:
+    """Compute call count, average duration and error rate in one pass."""
+    total_duration = 0.0
+    errors = 0
+    for trace in traces:
+        total_duration += trace["duration_ms"]
+        if trace.get("status") != "completed":
+            errors += 1
+
+    count = len(traces)
+    return {
+        "total_calls": count,
+        "avg_duration": total_duration / count if count else 0,
+        "error_rate": errors / count if count else 0,
+    }
+
+@lru_cache(maxsize=4096)
+def _local_hour_of_quarter(quarter: int) -> int:
+    """Return the local hour of day for a 15-minute slot since the epoch.
 
-def _find_peak_usage_hours(traces: List) -> List[int]:
-    """Find peak usage hours."""
-    hours = {}
+    UTC offsets and DST transitions fall on 15-minute boundaries, so every
+    instant in a slot shares one local hour and it is computed once per slot.
+    """
+    return datetime.fromtimestamp(quarter * 900).hour
+
+def _entry_hour(item: Dict) -> int:
+    """Return the local hour of day of a history entry."""
+    return _local_hour_of_quarter(int(_entry_epoch(item) // 900))
+
+def _count_hours(traces: List) -> List[int]:
+    """Count traces per local hour of day."""
+    counts = [0] * 24
     for trace in traces:
-        hour = datetime.fromisoformat(trace["timestamp"]).hour
-        hours[hour] = hours.get(hour, 0) + 1
+        counts[_entry_hour(trace)] += 1
+    return counts
 
-    return sorted(hours.keys(), key=lambda x: hours[x], reverse=True)[:3]
+def _find_peak_usage_hours(hour_counts: List[int]) -> List[int]:
+    """Find peak usage hours from per-hour trace counts."""
+    peak_hours = heapq.nlargest(3, range(24), key=hour_counts.__getitem__)
+    # Hours without traces only appear when fewer than three hours had any
+    return [hour for hour in peak_hours if hour_counts[hour]]
 
 def _find_slowest_operations(traces: List) -> List[Dict]:
     """Find slowest operations."""
-    sorted_traces = sorted(traces, key=lambda x: x.get("duration_ms", 0), reverse=True)
-    return sorted_traces[:5]
+    return heapq.nlargest(5, traces, key=lambda x: x.get("duration_ms", 0))
 
 def _analyze_error_patterns(traces: List) -> Dict[str, Any]:
     """Analyze error patterns."""
-    errors = [t for t in traces if t.get("status") != "completed"]
-    return {"total_errors": len(errors), "error_rate": len(errors) / len(traces) if traces else 0}
+    errors = sum(1 for t in traces if t.get("status") != "completed")
+    return {"total_errors": errors, "error_rate": errors / len(traces) if traces else 0}
 
 def _identify_bottlenecks(patterns: Dict) -> List[str]:
     """Identify performance bottlenecks."""
@@ -1133,9 +2016,17 @@ def _collect_recent_traces(ctx: Context) -> List[Dict]:
     """Collect recent traces."""
     return []
 
-async def main():
+def main():
     """Main entry point for the observability MCP server."""
     logger.info("Starting Observability MCP Server", version="0.1.0")
+
+    # Use the libuv event loop when the optional uvloop extra is installed
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     mcp.run(transport="stdio")
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+"""
+Tests for the Observability MCP CLI.
+"""
+
+import io
+import json
+import os
+import sys
+import types
+from unittest.mock import patch
+
+import pytest
+
+from observability_mcp import cli
+
+
+class FakeTerminal(io.StringIO):
+    """Text stream with a bytes buffer that reports itself as a terminal."""
+
+    def __init__(self, tty: bool = True):
+        super().__init__()
+        self.buffer = io.BytesIO()
+        self.tty = tty
+
+    def isatty(self):
+        return self.tty
+
+
+@pytest.fixture
+def prebuilt():
+    """Ship fake pre-rendered output for the duration of a test."""
+    module = types.ModuleType("observability_mcp._cli_text")
+    module.HEALTH = b"prebuilt health\n"
+    with patch.dict(sys.modules, {"observability_mcp._cli_text": module}):
+        yield module
+
+
+class TestPrebuiltOutput:
+    """Test replay of build-time rendered output."""
+
+    def test_prebuilt_output_written_on_wide_color_terminal(self, prebuilt, monkeypatch):
+        """Wide color terminals get the shipped bytes as is."""
+        monkeypatch.delenv("NO_COLOR", raising=False)
+        monkeypatch.setenv("TERM", "xterm-256color")
+        terminal = FakeTerminal()
+        with patch.object(sys, "stdout", terminal), \
+                patch("shutil.get_terminal_size", return_value=os.terminal_size((120, 40))):
+            assert cli._write_prebuilt("HEALTH")
+
+        assert terminal.buffer.getvalue() == b"prebuilt health\n"
+
+    @pytest.mark.parametrize("env, columns", [
+        ({"NO_COLOR": "1", "TERM": "xterm"}, 120),
+        ({"TERM": "dumb"}, 120),
+        ({"TERM": "xterm"}, 60),
+    ])
+    def test_prebuilt_output_skipped_when_terminal_differs(self, prebuilt, monkeypatch, env, columns):
+        """NO_COLOR, dumb and narrow terminals fall back to live rendering."""
+        monkeypatch.delenv("NO_COLOR", raising=False)
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        terminal = FakeTerminal()
+        with patch.object(sys, "stdout", terminal), \
+                patch("shutil.get_terminal_size", return_value=os.terminal_size((columns, 40))):
+            assert not cli._write_prebuilt("HEALTH")
+
+        assert terminal.buffer.getvalue() == b""
+
+
+class TestVersion:
+    """Test version reporting."""
+
+    def test_version_comes_from_package(self, capsys):
+        """The CLI and the console entry point report the package version."""
+        from observability_mcp import __main__, __version__
+
+        with patch.object(sys, "argv", ["observability-mcp", "--version"]):
+            __main__.main()
+        assert capsys.readouterr().out == f"observability-mcp {__version__}\n"
+        assert (f"Version: {__version__}", None) in cli._HEALTH_LINES
+
+
+class TestDispatch:
+    """Test argument parsing and command dispatch."""
+
+    def test_help_text_matches_parser(self, monkeypatch):
+        """The static top-level help is what argparse would print."""
+        monkeypatch.setenv("COLUMNS", "80")
+        assert cli._HELP_TEXT == cli._build_parser(None).format_help()
+
+    @pytest.mark.parametrize("argv", [[], ["-h"], ["--help"]])
+    def test_main_prints_static_help(self, capsys, argv):
+        """No arguments or a help flag print the static help without building a parser."""
+        with patch.object(sys, "argv", ["observability-mcp", *argv]), \
+                patch.object(cli, "_build_parser") as build_parser:
+            cli.main()
+
+        assert capsys.readouterr().out == cli._HELP_TEXT
+        build_parser.assert_not_called()
+
+    @pytest.mark.parametrize("argv, command, kwargs", [
+        (["health"], "health", {}),
+        (["docs"], "docs", {}),
+        (["metrics"], "metrics", {"fmt": "table"}),
+        (["metrics", "--format", "json"], "metrics", {"fmt": "json"}),
+    ])
+    def test_main_dispatches_subcommand(self, argv, command, kwargs):
+        """Subcommands are dispatched with their parsed options."""
+        calls = []
+        with patch.object(sys, "argv", ["observability-mcp", *argv]), \
+                patch.dict(cli.COMMANDS, {command: lambda **options: calls.append(options)}):
+            cli.main()
+
+        assert calls == [kwargs]
+
+    def test_main_rejects_unknown_format(self, capsys):
+        """Unknown metrics formats are usage errors."""
+        with patch.object(sys, "argv", ["observability-mcp", "metrics", "--format", "xml"]):
+            with pytest.raises(SystemExit) as exc_info:
+                cli.main()
+
+        assert exc_info.value.code == 2
+        assert "invalid choice: 'xml'" in capsys.readouterr().err
+
+
+class TestMetricsFormats:
+    """Test machine-readable metrics output."""
+
+    def test_metrics_prom_format(self, capsys):
+        """Prometheus output has one gauge sample per component."""
+        cli.metrics(fmt="prom")
+
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[:2] == [
+            "# HELP observability_mcp_component_up Whether an observability component is enabled.",
+            "# TYPE observability_mcp_component_up gauge",
+        ]
+        assert lines[2:] == [
+            f'observability_mcp_component_up{{component="{name}"}} 1' for name in cli._COMPONENTS
+        ]
+        assert 'component="health_checks"' in lines[4]
+
+    def test_metrics_json_format(self, capsys):
+        """JSON output reports the version and every component."""
+        cli.metrics(fmt="json")
+
+        payload = json.loads(capsys.readouterr().out)
+        assert payload == {
+            "version": cli.VERSION,
+            "components": {name: True for name in cli._COMPONENTS},
+        }
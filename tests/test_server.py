@@ -6,13 +6,26 @@ persistent storage, and all monitoring tools.
 """
 
 import asyncio
+import json
+import os
+import sys
+import time
+import types
 import pytest
+from collections import deque
 from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime, timedelta
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.trace import SpanContext, TraceFlags
+from pydantic import ValidationError
 
+from observability_mcp.cache import TTLCache
 from observability_mcp.server import (
     mcp,
+    DropCountingSpanProcessor,
     HealthCheckResult,
+    MetricsSnapshotCache,
     PerformanceMetrics,
     TraceInfo,
     AlertConfig,
@@ -25,32 +38,94 @@ from observability_mcp.server import (
     monitor_system_resources,
     analyze_mcp_interactions,
     export_metrics,
+    report_cache,
+    ANOMALY_MIN_SAMPLES,
+    ANOMALY_Z_SCORE,
+    KEY_INDEX_TTL_SECONDS,
+    _analyze_performance_trends,
+    _analyze_system_health,
+    _analyze_system_trends,
+    _analyze_trace_patterns,
+    _build_span_exporter,
+    _append_bounded,
+    _append_performance,
+    _append_trace,
+    _buffered_hour_counts,
+    _buffered_operation_counts,
+    _buffered_stats,
+    _close_session,
+    _compile_alert_rules,
+    _count_hours,
+    _detect_performance_anomalies,
+    _entry_hour,
+    _find_peak_usage_hours,
+    _generate_performance_summary,
+    _get_session,
+    _indexed_keys,
+    _load_alert_configs,
+    _metric_labels,
+    _mget_history,
+    _save_alert_configs,
+    _scan_history,
+    _service_class,
+    _storage_set,
+    _stream_json_export,
+    _summarize_service_traces,
 )
 
 
+class InMemoryStorage:
+    """Async key-value store standing in for the FastMCP context storage."""
+
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+
+    async def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    async def set(self, key, value):
+        self.data[key] = value
+
+    async def keys(self):
+        return list(self.data)
+
+
+def storage_context(data=None):
+    """Build a tool context whose storage holds the given keys."""
+    ctx = MagicMock()
+    ctx.storage = InMemoryStorage(data)
+    return ctx
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    """Give each test its own psutil snapshot and reports instead of ones cached by another test."""
+    report_cache.clear()
+    with patch('observability_mcp.server._system_sample', (0.0, None)):
+        yield
+
+
 class TestHealthMonitoring:
     """Test health monitoring functionality."""
 
     @pytest.mark.asyncio
     async def test_monitor_server_health_success(self):
         """Test successful health check."""
-        with patch('observability_mcp.server.aiohttp.ClientSession') as mock_session:
+        mock_session = MagicMock()
+        with patch('observability_mcp.server._get_session', AsyncMock(return_value=mock_session)):
             # Mock successful response
             mock_response = AsyncMock()
             mock_response.status = 200
             mock_response.read.return_value = b'OK'
-            mock_response.headers = {'content-type': 'text/plain'}
+            mock_response.headers = {'content-type': 'text/plain', 'Content-Length': '2'}
 
-            mock_session.return_value.__aenter__.return_value.get.return_value.__aenter__.return_value = mock_response
-            mock_session.return_value.__aenter__.return_value.get.return_value.__aexit__.return_value = None
-            mock_session.return_value.__aexit__.return_value = None
+            mock_session.get.return_value.__aenter__.return_value = mock_response
+            mock_session.get.return_value.__aexit__.return_value = None
 
             # Mock context
-            ctx = MagicMock()
-            ctx.storage.get.return_value = []
-            ctx.storage.set = AsyncMock()
+            ctx = storage_context()
 
-            result = await monitor_server_health(
+            result = await monitor_server_health.fn(
                 ctx=ctx,
                 service_url="http://example.com/health"
             )
@@ -59,18 +134,23 @@ class TestHealthMonitoring:
             assert result['health_check']['response_time_ms'] > 0
             assert 'recommendations' in result
 
+            # The check goes through the shared session with a per-request timeout
+            (url,), kwargs = mock_session.get.call_args
+            assert url == "http://example.com/health"
+            assert kwargs['timeout'].total == 5.0
+            assert ctx.storage.data["health_history:http://example.com/health"]
+
     @pytest.mark.asyncio
     async def test_monitor_server_health_failure(self):
         """Test failed health check."""
-        with patch('observability_mcp.server.aiohttp.ClientSession') as mock_session:
+        mock_session = MagicMock()
+        with patch('observability_mcp.server._get_session', AsyncMock(return_value=mock_session)):
             # Mock failed response
-            mock_session.return_value.__aenter__.return_value.get.side_effect = Exception("Connection failed")
+            mock_session.get.side_effect = Exception("Connection failed")
 
-            ctx = MagicMock()
-            ctx.storage.get.return_value = []
-            ctx.storage.set = AsyncMock()
+            ctx = storage_context()
 
-            result = await monitor_server_health(
+            result = await monitor_server_health.fn(
                 ctx=ctx,
                 service_url="http://example.com/health"
             )
@@ -78,6 +158,33 @@ class TestHealthMonitoring:
             assert result['health_check']['status'] == 'unhealthy'
             assert 'error_message' in result['health_check']
 
+    @pytest.mark.asyncio
+    async def test_get_session_builds_pooled_session_once(self):
+        """The shared session is created once, on a pooled connector with DNS caching."""
+        with patch('observability_mcp.server._http_session', None), \
+                patch('observability_mcp.server.aiohttp.TCPConnector') as mock_connector, \
+                patch('observability_mcp.server.aiohttp.ClientSession') as mock_client_session:
+            mock_client_session.return_value.closed = False
+
+            session = await _get_session()
+            assert await _get_session() is session
+
+            mock_client_session.assert_called_once_with(connector=mock_connector.return_value)
+            assert mock_connector.call_args.kwargs['ttl_dns_cache'] == 300
+
+    @pytest.mark.asyncio
+    async def test_get_session_reuses_one_session_until_closed(self):
+        """Health checks share one lazily created session, reopened after shutdown closes it."""
+        with patch('observability_mcp.server._http_session', None):
+            session = await _get_session()
+            assert await _get_session() is session
+
+            await _close_session()
+            assert session.closed
+            reopened = await _get_session()
+            assert reopened is not session
+            await _close_session()
+
 
 class TestPerformanceMonitoring:
     """Test performance monitoring functionality."""
@@ -99,11 +206,9 @@ class TestPerformanceMonitoring:
                 packets_recv=20
             )
 
-            ctx = MagicMock()
-            ctx.storage.get.return_value = []
-            ctx.storage.set = AsyncMock()
+            ctx = storage_context()
 
-            result = await collect_performance_metrics(ctx=ctx, service_name="test-service")
+            result = await collect_performance_metrics.fn(ctx=ctx, service_name="test-service")
 
             assert result['metrics']['cpu_percent'] == 45.5
             assert result['metrics']['memory_mb'] == 1024.0  # 1GB in MB
@@ -111,6 +216,26 @@ class TestPerformanceMonitoring:
             assert 'trends' in result
             assert 'recommendations' in result
 
+    def test_performance_trends_match_last_ten_average(self):
+        """Trends average the last ten points and compare the latest against them."""
+        history = [{"cpu_percent": float(i), "memory_mb": 500.0 - i} for i in range(12)]
+        recent = history[-10:]
+        cpu_avg = sum(h["cpu_percent"] for h in recent) / len(recent)
+        memory_avg = sum(h["memory_mb"] for h in recent) / len(recent)
+
+        for rows in (history, deque(history, maxlen=12)):
+            trends = _analyze_performance_trends(rows)
+            assert trends == {
+                "cpu_trend": "increasing",
+                "memory_trend": "stable",
+                "avg_cpu_percent": cpu_avg,
+                "avg_memory_mb": memory_avg,
+            }
+
+        assert _analyze_performance_trends(history[:1]) == {"insufficient_data": True}
+        flat = _analyze_performance_trends([{"cpu_percent": 20.0, "memory_mb": 300.0}] * 2)
+        assert flat["cpu_trend"] == flat["memory_trend"] == "stable"
+
 
 class TestTracing:
     """Test tracing functionality."""
@@ -118,11 +243,9 @@ class TestTracing:
     @pytest.mark.asyncio
     async def test_trace_mcp_calls(self):
         """Test MCP call tracing."""
-        ctx = MagicMock()
-        ctx.storage.get.return_value = []
-        ctx.storage.set = AsyncMock()
+        ctx = storage_context()
 
-        result = await trace_mcp_calls(
+        result = await trace_mcp_calls.fn(
             ctx=ctx,
             operation_name="test_operation",
             service_name="test-service",
@@ -137,6 +260,15 @@ class TestTracing:
         assert 'patterns' in result
         assert 'performance_insights' in result
 
+    def test_analyze_trace_patterns_ranks_operations(self):
+        """Operations are ranked by call count."""
+        history = [{"operation": "read"}, {"operation": "write"}, {"operation": "read"}, {}]
+
+        patterns = _analyze_trace_patterns(history)
+
+        assert patterns["most_common_operations"][0] == ("read", 2)
+        assert patterns["total_operations"] == 3
+
 
 class TestReporting:
     """Test reporting functionality."""
@@ -154,11 +286,9 @@ class TestReporting:
             for i in range(7)  # 7 days of data
         ]
 
-        ctx = MagicMock()
-        ctx.storage.get.return_value = mock_history
-        ctx.storage.set = AsyncMock()
+        ctx = storage_context({"performance_history:test-service": mock_history})
 
-        result = await generate_performance_reports(
+        result = await generate_performance_reports.fn(
             ctx=ctx,
             service_name="test-service",
             days=7
@@ -170,6 +300,65 @@ class TestReporting:
         assert 'recommendations' in result
         assert result['summary']['total_measurements'] == 7
 
+    @pytest.mark.asyncio
+    async def test_generate_performance_reports_for_all_services(self):
+        """Reports across services carry one section per service, and repeat calls hit the cache."""
+        now = datetime.now()
+
+        def history(cpu_values):
+            return [
+                {
+                    "timestamp": (now - timedelta(minutes=i)).isoformat(),
+                    "cpu_percent": cpu,
+                    "memory_mb": 512.0,
+                }
+                for i, cpu in enumerate(cpu_values)
+            ]
+
+        ctx = storage_context({
+            "performance_history:steady": history([20.0] * 5),
+            "performance_history:spiky": history([90.0] + [10.0] * 9),
+        })
+
+        result = await generate_performance_reports.fn(ctx=ctx, days=1)
+
+        assert result['summary']['steady']['total_measurements'] == 5
+        assert result['trends']['spiky']['peak_cpu'] == 90.0
+        assert [(a['service'], a['metric_name']) for a in result['anomalies']] == [("spiky", "cpu_percent")]
+        assert await generate_performance_reports.fn(ctx=ctx, days=1) is result
+
+
+class TestTTLCache:
+    """Test the in-memory TTL caches."""
+
+    def test_ttl_cache_expires_and_invalidates_by_prefix(self):
+        """Cached entries expire after the TTL and can be dropped by key prefix."""
+        cache = TTLCache(maxsize=2, ttl=30)
+        cache.set(("report", "a", 7), 1)
+        cache.set(("report", "b", 7), 2)
+        assert cache.pop(("report", "a")) == 1
+        assert cache.get(("report", "a", 7)) is None
+        assert cache.get(("report", "b", 7)) == 2
+
+        with patch('observability_mcp.cache.time.monotonic', return_value=time.monotonic() + 31):
+            assert cache.get(("report", "b", 7)) is None
+
+    @pytest.mark.asyncio
+    async def test_metrics_snapshot_cache_builds_once_per_window(self):
+        """Concurrent scrapes within the TTL share one built payload."""
+        cache = MetricsSnapshotCache(ttl_seconds=30)
+        builds = []
+
+        async def build():
+            builds.append(1)
+            await asyncio.sleep(0)
+            return {"format": "json"}
+
+        payloads = await asyncio.gather(*(cache.get_or_build(("json", False), build) for _ in range(3)))
+
+        assert builds == [1]
+        assert all(payload is payloads[0] for payload in payloads)
+
 
 class TestAlerting:
     """Test alerting functionality."""
@@ -179,24 +368,54 @@ class TestAlerting:
         """Test anomaly detection and alerting."""
         # Mock alert configurations
         mock_configs = [
-            AlertConfig(metric_name="cpu_percent", threshold=80.0, operator="gt", severity="warning").dict()
+            AlertConfig(metric_name="cpu_percent", threshold=80.0, operator="gt", severity="warning").model_dump()
         ]
 
-        ctx = MagicMock()
-        ctx.storage.get.side_effect = lambda key: {
+        ctx = storage_context({
             "alert_configs": mock_configs,
             "performance_history:test-service": [
                 {"timestamp": datetime.now().isoformat(), "cpu_percent": 85.0}  # Above threshold
             ]
-        }[key]
+        })
 
-        result = await alert_on_anomalies(ctx=ctx, service_name="test-service")
+        result = await alert_on_anomalies.fn(ctx=ctx, service_name="test-service")
 
         assert 'active_alerts' in result
         assert 'detected_anomalies' in result
         assert 'alert_configs' in result
         assert 'recommendations' in result
 
+    def test_compile_alert_rules_groups_enabled_configs(self):
+        """Enabled configs are grouped by metric with their comparison resolved."""
+        cpu_high = AlertConfig(metric_name="cpu_percent", threshold=80.0, operator="gt", severity="warning")
+        cpu_low = AlertConfig(metric_name="cpu_percent", threshold=10.0, operator="lt", severity="info")
+        memory = AlertConfig(metric_name="memory_mb", threshold=1.0, operator="gt", severity="error", enabled=False)
+
+        rules = _compile_alert_rules([cpu_high, cpu_low, memory])
+
+        assert list(rules) == ["cpu_percent"]
+        assert [(compare(85.0, config.threshold), config) for compare, config in rules["cpu_percent"]] == [
+            (True, cpu_high),
+            (False, cpu_low),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_alert_configs_are_revalidated_only_on_version_change(self):
+        """Cached alert configs are reused until a save bumps the version."""
+        stored = {}
+        ctx = MagicMock()
+        ctx.storage.get = AsyncMock(side_effect=lambda key, default=None: stored.get(key, default))
+        ctx.storage.set = AsyncMock(side_effect=stored.__setitem__)
+        config = AlertConfig(metric_name="cpu_percent", threshold=80.0, operator="gt", severity="warning")
+
+        await _save_alert_configs(ctx.storage, [config])
+        first = await _load_alert_configs(ctx)
+        assert first == [config]
+        assert await _load_alert_configs(ctx) is first
+
+        await _save_alert_configs(ctx.storage, [config, config])
+        assert stored["alert_configs_version"] == 2
+        assert len(await _load_alert_configs(ctx)) == 2
 
 class TestSystemMonitoring:
     """Test system monitoring functionality."""
@@ -245,18 +464,18 @@ class TestSystemMonitoring:
 
             # Mock process iterator
             mock_process = MagicMock()
-            mock_process.pid = 1234
-            mock_process.name.return_value = "python"
-            mock_process.cpu_percent.return_value = 5.0
-            mock_process.memory_percent.return_value = 2.0
+            mock_process.info = {
+                'pid': 1234,
+                'name': "python",
+                'cpu_percent': 5.0,
+                'memory_percent': 2.0,
+            }
 
             mock_psutil.process_iter.return_value = [mock_process]
 
-            ctx = MagicMock()
-            ctx.storage.get.return_value = []
-            ctx.storage.set = AsyncMock()
+            ctx = storage_context()
 
-            result = await monitor_system_resources(ctx=ctx)
+            result = await monitor_system_resources.fn(ctx=ctx)
 
             assert 'system_status' in result
             assert 'health_analysis' in result
@@ -266,7 +485,29 @@ class TestSystemMonitoring:
             assert system_status['cpu']['percent'] == 35.5
             assert system_status['memory']['percent'] == 50.0
             assert system_status['disk']['percent'] == 50.0
+            assert system_status['processes']['top_cpu'][0]['name'] == "python"
+
+
+    @pytest.mark.parametrize("cpu, memory, disk, score", [
+        (70, 80, 85, 100),
+        (70.1, 80, 85, 90),
+        (90, 90, 95, 65),
+        (95, 95, 99, 15),
+    ])
+    def test_system_health_score_thresholds(self, cpu, memory, disk, score):
+        """Penalties apply only once usage exceeds each threshold."""
+        status = {"cpu": {"percent": cpu}, "memory": {"percent": memory}, "disk": {"percent": disk}}
+
+        assert _analyze_system_health(status)["overall_score"] == score
+
+    def test_system_trends_replay_health_scores(self):
+        """Trends replay the health score of each stored snapshot."""
+        def snapshot(cpu):
+            return {"cpu": {"percent": cpu}, "memory": {"percent": 50}, "disk": {"percent": 50}}
 
+        trends = _analyze_system_trends([snapshot(95), snapshot(75), snapshot(10)])
+
+        assert trends == {"health_score_min": 70, "health_score_avg": 260 / 3, "health_score_change": 30}
 
 class TestAnalytics:
     """Test analytics functionality."""
@@ -286,19 +527,29 @@ class TestAnalytics:
             for i in range(24)  # 24 hours of data
         ]
 
-        ctx = MagicMock()
-        ctx.storage.keys.return_value = ["trace_history:test-service"]
-        ctx.storage.get.side_effect = lambda key: {
-            "trace_history:test-service": mock_traces
-        }.get(key, [])
+        ctx = storage_context({"trace_history:test-service": mock_traces})
 
-        result = await analyze_mcp_interactions(ctx=ctx, days=1)
+        result = await analyze_mcp_interactions.fn(ctx=ctx, days=1)
 
         assert 'patterns' in result
         assert 'insights' in result
         assert 'recommendations' in result
         assert result['patterns']['total_interactions'] == 24
 
+    def test_summarize_service_traces(self):
+        """Service summaries count calls, average duration and errors."""
+        traces = [
+            {"duration_ms": 10.0, "status": "completed"},
+            {"duration_ms": 30.0, "status": "failed"},
+        ]
+
+        assert _summarize_service_traces(traces) == {
+            "total_calls": 2,
+            "avg_duration": 20.0,
+            "error_rate": 0.5,
+        }
+        assert _summarize_service_traces([])["avg_duration"] == 0
+
 
 class TestExport:
     """Test export functionality."""
@@ -308,7 +559,7 @@ class TestExport:
         """Test Prometheus metrics export."""
         ctx = MagicMock()
 
-        result = await export_metrics(ctx=ctx, format="prometheus")
+        result = await export_metrics.fn(ctx=ctx, format="prometheus")
 
         assert result['format'] == 'prometheus'
         assert 'endpoint' in result
@@ -317,17 +568,44 @@ class TestExport:
     @pytest.mark.asyncio
     async def test_export_metrics_json(self):
         """Test JSON metrics export."""
-        ctx = MagicMock()
-        ctx.storage.keys.return_value = []
-        ctx.storage.get.return_value = []
+        ctx = storage_context()
 
-        result = await export_metrics(ctx=ctx, format="json", include_history=False)
+        result = await export_metrics.fn(ctx=ctx, format="json", include_history=False)
 
         assert result['format'] == 'json'
         assert 'timestamp' in result
         assert 'metrics' in result
         assert 'version' in result
 
+    @pytest.mark.asyncio
+    async def test_stream_json_export_writes_valid_document(self, tmp_path):
+        """Streamed JSON export writes one parseable document to a file."""
+        ctx = MagicMock()
+        ctx.storage.keys = AsyncMock(return_value=["trace_history:a", "trace_history:b", "other"])
+        ctx.storage.get = AsyncMock(side_effect=lambda key, default=None: [{"key": key}] * 30)
+
+        with patch('observability_mcp.server.EXPORT_DIR', str(tmp_path)):
+            path = await _stream_json_export(ctx, include_history=True)
+
+        with open(path, encoding="utf-8") as handle:
+            data = json.load(handle)
+        assert data['version'] == '0.1.0'
+        assert list(data['history']) == ["trace_history:a", "trace_history:b"]
+        assert len(data['history']["trace_history:a"]) == 20
+
+    @pytest.mark.asyncio
+    async def test_stream_json_export_keeps_newest_files(self, tmp_path):
+        """Streamed exports are pruned to the newest MAX_EXPORT_FILES."""
+        export_dir = tmp_path / "exports"
+        with patch('observability_mcp.server.EXPORT_DIR', str(export_dir)), \
+                patch('observability_mcp.server.MAX_EXPORT_FILES', 2):
+            paths = []
+            for i in range(3):
+                paths.append(await _stream_json_export(MagicMock(), include_history=False))
+                os.utime(paths[-1], (i, i))
+
+        assert sorted(os.listdir(export_dir)) == sorted(os.path.basename(path) for path in paths[1:])
+
 
 class TestDataModels:
     """Test data models and validation."""
@@ -385,6 +663,12 @@ class TestDataModels:
         assert config.operator == "gt"
         assert config.severity == "warning"
 
+    def test_models_are_frozen(self):
+        """Models reject assignment after construction."""
+        config = AlertConfig(metric_name="cpu_percent", threshold=90.0, operator="gt", severity="warning")
+        with pytest.raises(ValidationError):
+            config.threshold = 50.0
+
 
 class TestIntegration:
     """Integration tests for the observability server."""
@@ -398,27 +682,340 @@ class TestIntegration:
             mock_memory = MagicMock()
             mock_memory.used = 2 * 1024**3  # 2GB
             mock_psutil.virtual_memory.return_value = mock_memory
+            mock_psutil.disk_usage.return_value = MagicMock(percent=40.0)
+            mock_psutil.net_io_counters.return_value = MagicMock(
+                bytes_sent=1000, bytes_recv=2000, packets_sent=10, packets_recv=20
+            )
 
-            ctx = MagicMock()
-            ctx.storage.get.return_value = []
-            ctx.storage.set = AsyncMock()
+            ctx = storage_context()
 
             # Step 1: Collect metrics
-            metrics_result = await collect_performance_metrics(ctx=ctx)
+            metrics_result = await collect_performance_metrics.fn(ctx=ctx)
             assert 'metrics' in metrics_result
 
             # Step 2: Generate report
-            report_result = await generate_performance_reports(ctx=ctx, days=1)
+            report_result = await generate_performance_reports.fn(ctx=ctx, days=1)
             assert 'summary' in report_result
 
+            # The collected sample is buffered, so the service report is built from its columns
+            service_report = await generate_performance_reports.fn(ctx=ctx, service_name="system", days=1)
+            assert service_report['summary']['total_measurements'] == 1
+            assert service_report['summary']['avg_cpu'] == 65.0
+
             # Step 3: Check alerts
-            alert_result = await alert_on_anomalies(ctx=ctx)
+            alert_result = await alert_on_anomalies.fn(ctx=ctx)
             assert 'active_alerts' in alert_result
 
             # Verify workflow completion
             assert metrics_result['metrics']['cpu_percent'] == 65.0
 
 
+class TestMetricLabels:
+    """Test metric label sanitization."""
+
+    def test_metric_labels_are_bounded(self):
+        """Labels are allow-listed, stripped of query strings and truncated."""
+        labels = _metric_labels(
+            status="healthy",
+            service_class=_service_class("https://api.example.com/health?token=secret"),
+            service="x" * 100,
+            operation="read",
+            user_id="42",
+        )
+        assert labels == {
+            "status": "healthy",
+            "service_class": "api.example.com",
+            "service": "x" * 64,
+        }
+
+
+class TestSpanExport:
+    """Test span export wiring."""
 
+    def test_full_span_queue_counts_dropped_spans(self):
+        """Spans ended while the batch queue is full increment the drop counter."""
+        exporter = MagicMock()
+        processor = BatchSpanProcessor(
+            exporter, max_queue_size=2, schedule_delay_millis=60000, max_export_batch_size=2
+        )
+        wrapper = DropCountingSpanProcessor(processor, 2)
+        context = SpanContext(trace_id=1, span_id=1, is_remote=False, trace_flags=TraceFlags(TraceFlags.SAMPLED))
+
+        # Holding the export lock keeps the worker thread from draining the queue
+        with patch("observability_mcp.server.spans_dropped_counter") as counter:
+            with processor._batch_processor._export_lock:
+                for _ in range(4):
+                    wrapper.on_end(ReadableSpan(name="tool_call", context=context))
+            wrapper.shutdown()
+
+        assert counter.add.call_count == 2
+
+    def test_exporter_uses_otlp_when_endpoint_set_and_installed(self):
+        """A configured endpoint selects the OTLP exporter when the extra is installed."""
+        otlp_module = types.ModuleType("trace_exporter")
+        otlp_module.OTLPSpanExporter = MagicMock(return_value="otlp")
+        env = {"OTEL_EXPORTER_OTLP_ENDPOINT": "http://collector:4317", "OTEL_DEBUG_CONSOLE": "1"}
+
+        with patch.dict(os.environ, env), patch.dict(
+            sys.modules, {"opentelemetry.exporter.otlp.proto.grpc.trace_exporter": otlp_module}
+        ):
+            assert _build_span_exporter() == "otlp"
+
+    def test_exporter_falls_back_to_console_without_otlp_extra(self):
+        """Without the otlp extra, spans go to the console only when debugging is on."""
+        missing = {"opentelemetry.exporter.otlp.proto.grpc.trace_exporter": None}
+        env = {"OTEL_EXPORTER_OTLP_ENDPOINT": "http://collector:4317", "OTEL_DEBUG_CONSOLE": "1"}
+
+        with patch.dict(os.environ, env), patch.dict(sys.modules, missing):
+            assert isinstance(_build_span_exporter(), ConsoleSpanExporter)
+        with patch.dict(os.environ, {"OTEL_DEBUG_CONSOLE": "1"}):
+            os.environ.pop("OTEL_EXPORTER_OTLP_ENDPOINT", None)
+            assert isinstance(_build_span_exporter(), ConsoleSpanExporter)
+            os.environ.pop("OTEL_DEBUG_CONSOLE")
+            assert _build_span_exporter() is None
+
+
+class TestHistoryStorage:
+    """Test bounded history buffering."""
 
+    @pytest.mark.asyncio
+    async def test_append_bounded_caps_and_batches_writes(self):
+        """History is capped and only written back every flush interval."""
+        ctx = MagicMock()
+        ctx.storage.get = AsyncMock(return_value=[])
+        ctx.storage.set = AsyncMock()
+
+        with patch('observability_mcp.server.HISTORY_FLUSH_INTERVAL', 3):
+            for i in range(4):
+                history = await _append_bounded(ctx, "trace_history:buffered", {"i": i}, 2)
 
+        assert [item["i"] for item in history] == [2, 3]
+        # First append creates the key; the fourth fills the interval again
+        assert ctx.storage.set.await_count == 2
+        key, stored = ctx.storage.set.await_args.args
+        assert key == "trace_history:buffered"
+        assert json.loads(stored) == [{"i": 2}, {"i": 3}]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_first_appends_share_one_buffer(self):
+        """Appends racing to hydrate a key all land in the same buffer."""
+        ctx = storage_context()
+        read = ctx.storage.get
+
+        async def slow_get(key, default=None):
+            await asyncio.sleep(0.01)
+            return await read(key, default)
+
+        ctx.storage.get = slow_get
+        await asyncio.gather(*(
+            _append_bounded(ctx, "trace_history:concurrent", {"i": i}, 10) for i in range(5)
+        ))
+
+        history = await _append_bounded(ctx, "trace_history:concurrent", {"i": 5}, 10)
+        assert sorted(item["i"] for item in history) == list(range(6))
+
+    @pytest.mark.asyncio
+    async def test_switching_storage_flushes_displaced_buffer(self):
+        """Pending appends buffered for one storage are written back before another takes the key."""
+        first, second = storage_context(), storage_context()
+        with patch('observability_mcp.server.HISTORY_FLUSH_INTERVAL', 10):
+            await _append_bounded(first, "trace_history:switch", {"i": 0}, 10)
+            await _append_bounded(first, "trace_history:switch", {"i": 1}, 10)
+            await _append_bounded(second, "trace_history:switch", {"i": 2}, 10)
+
+        assert json.loads(first.storage.data["trace_history:switch"]) == [{"i": 0}, {"i": 1}]
+
+    @pytest.mark.asyncio
+    async def test_overlapping_flushes_keep_latest_history(self):
+        """A slow flush never overwrites a newer one, and pending appends are not lost."""
+        ctx = storage_context()
+        delays = [0.0, 0.05, 0.0]
+        write = ctx.storage.set
+
+        async def slow_set(key, value):
+            await asyncio.sleep(delays.pop(0))
+            await write(key, value)
+
+        ctx.storage.set = slow_set
+        await _append_bounded(ctx, "trace_history:overlap", {"i": 0}, 10)
+        buffer = await _append_bounded(ctx, "trace_history:overlap", {"i": 1}, 10)
+
+        from observability_mcp.server import _history_buffers
+        history_buffer = _history_buffers["trace_history:overlap"]
+        slow_flush = asyncio.create_task(history_buffer.flush())
+        await asyncio.sleep(0)
+        buffer.append({"i": 2})
+        history_buffer.pending += 1
+        await asyncio.gather(slow_flush, history_buffer.flush())
+
+        assert json.loads(ctx.storage.data["trace_history:overlap"]) == [{"i": 0}, {"i": 1}, {"i": 2}]
+        assert history_buffer.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_key_index_tracks_writes_without_rescanning(self):
+        """Keys are scanned once per storage, then kept current by writes."""
+        ctx = MagicMock()
+        ctx.storage.keys = AsyncMock(return_value=["report:a:1", "trace_history:a"])
+        ctx.storage.set = AsyncMock()
+
+        assert await _indexed_keys(ctx, "report:") == ["report:a:1"]
+        await _storage_set(ctx, "report:b:2", {})
+
+        assert await _indexed_keys(ctx, "report:") == ["report:a:1", "report:b:2"]
+        assert await _indexed_keys(ctx, "trace_history:") == ["trace_history:a"]
+        ctx.storage.keys.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_key_index_rescans_after_ttl(self):
+        """Keys written by another process show up once the index expires."""
+        ctx = MagicMock()
+        ctx.storage.keys = AsyncMock(return_value=["report:a:1"])
+
+        with patch("observability_mcp.server.time.monotonic", return_value=1000.0):
+            assert await _indexed_keys(ctx, "report:") == ["report:a:1"]
+        ctx.storage.keys.return_value = ["report:a:1", "report:b:2"]
+        with patch("observability_mcp.server.time.monotonic", return_value=1000.0 + KEY_INDEX_TTL_SECONDS):
+            assert await _indexed_keys(ctx, "report:") == ["report:a:1", "report:b:2"]
+
+        assert ctx.storage.keys.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_append_trace_maintains_hour_histogram(self):
+        """The trace hour histogram tracks appended and evicted entries."""
+        ctx = MagicMock()
+        ctx.storage.get = AsyncMock(return_value=None)
+        ctx.storage.set = AsyncMock()
+        start = datetime(2024, 1, 1, 9).timestamp()
+
+        for i in range(4):
+            history = await _append_trace(
+                ctx, "trace_history:hours", {"ts_epoch": start + i * 3600}, 3
+            )
+
+        counts = _buffered_hour_counts(ctx, "trace_history:hours", 3)
+        assert counts == _count_hours(history)
+        assert counts[10:13] == [1, 1, 1]
+        assert sum(counts) == 3
+
+    @pytest.mark.asyncio
+    async def test_append_trace_maintains_operation_counts(self):
+        """Operation counts drop operations whose last trace was evicted."""
+        ctx = MagicMock()
+        ctx.storage.get = AsyncMock(return_value=None)
+        ctx.storage.set = AsyncMock()
+
+        for operation in ["read", "write", "read", "scan"]:
+            history = await _append_trace(
+                ctx, "trace_history:operations", {"ts_epoch": 0.0, "operation": operation}, 2
+            )
+
+        operations = _buffered_operation_counts(ctx, "trace_history:operations")
+        assert operations == {"read": 1, "scan": 1}
+        assert _analyze_trace_patterns(history, operations) == _analyze_trace_patterns(history)
+
+        # Evicting the first "b" leaves a tie whose insertion order differs from a recount
+        for operation in ["b", "a", "b"]:
+            history = await _append_trace(
+                ctx, "trace_history:ties", {"ts_epoch": 0.0, "operation": operation}, 2
+            )
+        operations = _buffered_operation_counts(ctx, "trace_history:ties")
+        patterns = _analyze_trace_patterns(history, operations)
+        assert patterns == _analyze_trace_patterns(history)
+        assert patterns["most_common_operations"] == [("a", 1), ("b", 1)]
+
+    def test_entry_hour_matches_local_time(self):
+        """Hours derived from cached 15-minute slots match datetime.fromtimestamp."""
+        start = datetime(2024, 3, 9).timestamp()
+        for offset in range(0, 3 * 86400, 547):
+            ts_epoch = start + offset
+            assert _entry_hour({"ts_epoch": ts_epoch}) == datetime.fromtimestamp(ts_epoch).hour
+
+    @pytest.mark.asyncio
+    async def test_buffered_stats_match_entry_scan(self):
+        """Column-based aggregates agree with scanning the entries directly."""
+        ctx = MagicMock()
+        ctx.storage.get = AsyncMock(return_value=None)
+        ctx.storage.set = AsyncMock()
+        now = datetime.now()
+
+        for i in range(5):
+            entry = {
+                "timestamp": (now + timedelta(seconds=i)).isoformat(),
+                "ts_epoch": (now + timedelta(seconds=i)).timestamp(),
+                "cpu_percent": 10.0 * i,
+                "memory_mb": 100.0 + i,
+            }
+            history = await _append_performance(ctx, "performance_history:columns", entry, 4)
+
+        stats = _buffered_stats(ctx, "performance_history:columns", now.timestamp() - 60)
+        assert vars(stats) == vars(_scan_history(list(history)))
+        assert stats.count == 4
+        assert _buffered_stats(ctx, "performance_history:columns", now.timestamp() + 2) is None
+
+    def test_scan_history_feeds_every_report_section(self):
+        """One scan yields the summary averages, spread and peak anomalies."""
+        now = datetime.now()
+        history = [
+            {
+                "timestamp": (now + timedelta(minutes=i)).isoformat(),
+                "ts_epoch": (now + timedelta(minutes=i)).timestamp(),
+                "cpu_percent": 90.0 if i == 9 else 10.0,
+                "memory_mb": 256.0,
+            }
+            for i in range(10)
+        ]
+
+        stats = _scan_history(history)
+        assert stats.count == 10
+        assert stats.mean("cpu") == 18.0
+        assert stats.stddev("cpu") == 24.0
+        assert stats.stddev("mem") == 0.0
+        assert stats.max_ts - stats.min_ts == pytest.approx(540)
+        assert _generate_performance_summary(stats)["time_range"] == (
+            f"{history[0]['timestamp']} to {history[-1]['timestamp']}"
+        )
+
+        anomalies = _detect_performance_anomalies(None, {"svc": stats})
+        assert [(a["service"], a["metric_name"], a["z_score"]) for a in anomalies] == [("svc", "cpu_percent", 3.0)]
+
+    def test_anomalies_need_minimum_sample_count(self):
+        """A lone spike is flagged once the history is long enough to score it."""
+        def spiked(count):
+            return _scan_history([
+                {"timestamp": datetime.fromtimestamp(i).isoformat(), "ts_epoch": i,
+                 "cpu_percent": 95.0 if i == count - 1 else 10.0, "memory_mb": 256.0}
+                for i in range(count)
+            ])
+
+        assert ANOMALY_MIN_SAMPLES == 10
+        assert _detect_performance_anomalies(None, spiked(ANOMALY_MIN_SAMPLES - 1), "svc") == []
+        anomalies = _detect_performance_anomalies(None, spiked(ANOMALY_MIN_SAMPLES + 5), "svc")
+        assert [(a["metric_name"], a["peak"]) for a in anomalies] == [("cpu_percent", 95.0)]
+        assert anomalies[0]["z_score"] >= ANOMALY_Z_SCORE
+        assert _generate_performance_summary(_scan_history([])) == {"error": "No data available"}
+
+    @pytest.mark.asyncio
+    async def test_mget_history_uses_storage_multiget(self):
+        """Backends with multiget are read in one call instead of one get per key."""
+        now = time.time()
+        ctx = MagicMock()
+        ctx.storage.get = AsyncMock()
+        ctx.storage.multiget = AsyncMock(return_value={
+            "trace_history:b": json.dumps([{"ts_epoch": now - 7200}, {"ts_epoch": now}]),
+            "trace_history:a": [{"ts_epoch": now}],
+        })
+
+        histories = await _mget_history(ctx, "trace_history:", now - 3600)
+
+        ctx.storage.multiget.assert_awaited_once_with("trace_history:")
+        ctx.storage.get.assert_not_called()
+        assert list(histories) == ["a", "b"]
+        assert histories["b"] == [{"ts_epoch": now}]
+
+    def test_find_peak_usage_hours_skips_empty_hours(self):
+        """Peak hours are ranked by count and never include hours without traces."""
+        counts = [0] * 24
+        counts[9], counts[14], counts[3], counts[20] = 5, 7, 5, 1
+
+        assert _find_peak_usage_hours(counts) == [14, 3, 9]
+        assert _find_peak_usage_hours([0] * 23 + [2]) == [23]